@@ -0,0 +1,337 @@
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from bitcoin_layer2 import Layer2Protocol
+
+NETWORKS = ('scale_free', 'small_world', 'random')
+CAPACITIES = ('uniform', 'lognormal', 'pareto')
+WORKLOADS = ('uniform', 'hotspot', 'heavy_tailed')
+
+Payment = Tuple[str, str, int]
+
+# (metric, True if higher is better, label) compared by compare_to_baseline
+BASELINE_CHECKS = (
+    ('ops_per_sec', True, 'throughput'),
+    ('success_rate', True, 'success rate'),
+    ('p99_ms', False, 'p99 latency'),
+    ('network_mb', False, 'network memory')
+)
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Mean, nearest-rank p50/p90/p99 and max of per-payment latencies in seconds, reported in ms"""
+    if not latencies:
+        return dict.fromkeys(('mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'), 0.0)
+    ordered = sorted(latencies)
+    rank = lambda fraction: ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] * 1000
+    return {
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': rank(0.50),
+        'p90_ms': rank(0.90),
+        'p99_ms': rank(0.99),
+        'max_ms': ordered[-1] * 1000
+    }
+
+def _rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, if the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _scale_free_edges(nodes: int, channels: int, rng: random.Random) -> List[Tuple[int, int]]:
+    """Barabási–Albert preferential attachment: each new node opens m channels to well-connected nodes"""
+    m = max(1, channels // nodes)
+    edges = [(i, j) for i in range(m + 1) for j in range(i)]
+    # Every endpoint appears once per channel, so sampling it is sampling by degree
+    endpoints = [node for edge in edges for node in edge]
+    for node in range(m + 1, nodes):
+        targets = set()
+        while len(targets) < m:
+            targets.add(rng.choice(endpoints))
+        for target in targets:
+            edges.append((node, target))
+            endpoints.extend((node, target))
+    return edges
+
+def _small_world_edges(nodes: int, channels: int, rng: random.Random, rewire: float = 0.1) -> List[Tuple[int, int]]:
+    """Watts–Strogatz: a ring lattice with k/2 neighbours per side, each edge rewired with probability rewire"""
+    half = max(1, channels // nodes)
+    existing = set()
+    edges = []
+    for node in range(nodes):
+        for offset in range(1, half + 1):
+            target = (node + offset) % nodes
+            if rng.random() < rewire:
+                target = rng.randrange(nodes)
+            pair = (min(node, target), max(node, target))
+            if target == node or pair in existing:
+                continue
+            existing.add(pair)
+            edges.append((node, target))
+    return edges
+
+def _random_edges(nodes: int, channels: int, rng: random.Random) -> List[Tuple[int, int]]:
+    """Erdős–Rényi G(n, m): channels distinct node pairs chosen uniformly"""
+    channels = min(channels, nodes * (nodes - 1) // 2)
+    existing = set()
+    edges = []
+    while len(edges) < channels:
+        a, b = rng.randrange(nodes), rng.randrange(nodes)
+        pair = (min(a, b), max(a, b))
+        if a == b or pair in existing:
+            continue
+        existing.add(pair)
+        edges.append((a, b))
+    return edges
+
+def _capacity(distribution: str, median: int, rng: random.Random) -> int:
+    if distribution == 'uniform':
+        return rng.randint(1, 2 * median)
+    if distribution == 'lognormal':
+        return max(1, int(rng.lognormvariate(math.log(median), 1.0)))
+    if distribution == 'pareto':
+        # Shape 1.5: most channels are small, a few hold most of the capacity
+        return max(1, int(median / 2 ** (1 / 1.5) * rng.paretovariate(1.5)))
+    raise ValueError(f"Unknown capacity distribution {distribution}")
+
+def generate_network(kind: str, nodes: int, channels: int, capacity: str = 'lognormal',
+                     median_capacity: int = 1_000_000, seed: int = 0) -> List[Tuple]:
+    """Channel definitions for Layer2Protocol.load_channels, with balances split uniformly at random"""
+    rng = random.Random(seed)
+    if kind == 'scale_free':
+        edges = _scale_free_edges(nodes, channels, rng)
+    elif kind == 'small_world':
+        edges = _small_world_edges(nodes, channels, rng)
+    elif kind == 'random':
+        edges = _random_edges(nodes, channels, rng)
+    else:
+        raise ValueError(f"Unknown network kind {kind}")
+
+    definitions = []
+    for i, (a, b) in enumerate(edges):
+        channel_capacity = _capacity(capacity, median_capacity, rng)
+        definitions.append((f"chan{i}", channel_capacity, f"node{a}", f"node{b}",
+                            rng.randint(0, channel_capacity), rng.randint(0, 1000), rng.randint(0, 2000)))
+    return definitions
+
+def generate_payments(nodes: int, count: int, workload: str = 'uniform', median_amount: int = 10_000,
+                      seed: int = 0, hotspot_fraction: float = 0.01, hotspot_share: float = 0.8) -> List[Payment]:
+    """(source, destination, amount) payments
+
+    uniform: random node pairs and amounts up to twice the median.
+    hotspot: hotspot_share of the payments go to or from hotspot_fraction of the nodes.
+    heavy_tailed: random pairs with Pareto-distributed amounts.
+    """
+    # A stream of its own: Random(seed) would replay generate_network's draws and pick channel endpoints as pairs
+    rng = random.Random(f"{seed}/payments/{workload}")
+    hotspots = max(1, int(nodes * hotspot_fraction))
+    payments = []
+    while len(payments) < count:
+        source, destination = rng.randrange(nodes), rng.randrange(nodes)
+        if workload == 'hotspot' and rng.random() < hotspot_share:
+            if rng.random() < 0.5:
+                source = rng.randrange(hotspots)
+            else:
+                destination = rng.randrange(hotspots)
+        if source == destination:
+            continue
+        if workload == 'heavy_tailed':
+            amount = max(1, int(median_amount / 2 ** (1 / 1.2) * rng.paretovariate(1.2)))
+        elif workload in ('uniform', 'hotspot'):
+            amount = rng.randint(1, 2 * median_amount)
+        else:
+            raise ValueError(f"Unknown workload {workload}")
+        payments.append((f"node{source}", f"node{destination}", amount))
+    return payments
+
+def build_network(definitions: Sequence[Tuple], route_cache_size: int = 0,
+                  trace_memory: bool = False) -> Tuple[Layer2Protocol, Dict]:
+    """Load definitions into a fresh protocol; returns it with build time and memory figures
+
+    With trace_memory the bytes held by the protocol are measured with
+    tracemalloc, which slows the build down several times, so build_s is
+    only meaningful without it.
+    """
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    l2 = Layer2Protocol(route_cache_size=route_cache_size)
+    l2.load_channels(definitions)
+    elapsed = time.perf_counter() - start
+    network_mb = None
+    if trace_memory:
+        network_mb = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+        tracemalloc.stop()
+    return l2, {
+        'nodes': len(l2.routing_table),
+        'channels': len(l2.channels),
+        'build_s': elapsed,
+        'network_mb': network_mb,
+        'peak_rss_mb': _rss_mb()
+    }
+
+def replay(l2: Layer2Protocol, payments: Sequence[Payment], threads: int = 1) -> Dict:
+    """Route and execute payments, split over threads; returns throughput, latency and success figures"""
+    latencies = [0.0] * len(payments)
+    succeeded = [False] * len(payments)
+    hops = [0] * len(payments)
+
+    def worker(indices: range) -> None:
+        for i in indices:
+            source, destination, amount = payments[i]
+            start = time.perf_counter()
+            path = l2.find_payment_path(source, destination, amount)
+            if path:
+                succeeded[i] = l2.execute_multi_hop_payment(path, amount, source)
+                if succeeded[i]:
+                    hops[i] = len(path)
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if threads <= 1:
+        worker(range(len(payments)))
+    else:
+        workers = [threading.Thread(target=worker, args=(range(k, len(payments), threads),))
+                   for k in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    successes = sum(succeeded)
+    stats = {
+        'payments': len(payments),
+        'threads': threads,
+        'success_rate': successes / len(payments) if payments else 0.0,
+        'mean_hops': sum(hops) / successes if successes else 0.0,
+        'ops_per_sec': len(payments) / elapsed if elapsed else float('inf')
+    }
+    stats.update(_latency_summary(latencies))
+    return stats
+
+def run_benchmarks(networks: Sequence[str], workloads: Sequence[str], nodes: int, channels: int,
+                   payments: int, capacity: str = 'lognormal', median_amount: int = 10_000, threads: int = 1,
+                   route_cache_size: int = 0, trace_memory: bool = False, seed: int = 0) -> Dict[str, Dict]:
+    """Benchmark every (network, workload) pair; results are keyed 'network/workload'
+
+    Each workload replays against a freshly loaded copy of the network so
+    earlier workloads do not drain its liquidity.
+    """
+    results = {}
+    for kind in networks:
+        definitions = generate_network(kind, nodes, channels, capacity, seed=seed)
+        for workload in workloads:
+            l2, network = build_network(definitions, route_cache_size, trace_memory)
+            workload_payments = generate_payments(nodes, payments, workload, median_amount, seed=seed)
+            stats = replay(l2, workload_payments, threads)
+            stats.update(network)
+            if l2.route_cache is not None:
+                stats['route_cache_hit_rate'] = l2.route_cache.stats()['hit_rate']
+            results[f"{kind}/{workload}"] = stats
+            del l2
+    return results
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Describe every BASELINE_CHECKS metric that moved more than tolerance the wrong way
+
+    Throughput and success rate may drop, and p99 latency and traced network
+    memory may grow, by at most the fraction tolerance of their baseline value.
+    Benchmarks or metrics missing on either side (network_mb is only measured
+    with --trace-memory) are skipped.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_better, label in BASELINE_CHECKS:
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            if higher_is_better:
+                limit = before * (1 - tolerance)
+                regressed = after < limit
+            else:
+                limit = before * (1 + tolerance)
+                regressed = after > limit
+            if regressed:
+                regressions.append(f"{name} {label}: {after:.4g} {metric}, baseline {before:.4g} (limit {limit:.4g})")
+    return regressions
+
+def print_report(results: Dict[str, Dict]) -> None:
+    print(f"{'benchmark':<26}{'channels':>10}{'build s':>9}{'ops/s':>10}{'success':>9}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'net MB':>9}{'rss MB':>9}")
+    missing = float('nan')
+    for name, stats in results.items():
+        network_mb, rss = stats['network_mb'], stats['peak_rss_mb']
+        print(f"{name:<26}{stats['channels']:>10}{stats['build_s']:>9.2f}{stats['ops_per_sec']:>10.1f}"
+              f"{stats['success_rate']:>9.1%}{stats['p50_ms']:>9.3f}{stats['p99_ms']:>9.3f}"
+              f"{network_mb if network_mb is not None else missing:>9.1f}"
+              f"{rss if rss is not None else missing:>9.1f}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Layer2Protocol routing and payments on synthetic networks")
+    parser.add_argument('--networks', nargs='*', choices=NETWORKS, default=list(NETWORKS))
+    parser.add_argument('--workloads', nargs='*', choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument('--nodes', type=int, default=2_000)
+    parser.add_argument('--channels', type=int, default=10_000)
+    parser.add_argument('--payments', type=int, default=1_000, help="payments per workload")
+    parser.add_argument('--capacity', choices=CAPACITIES, default='lognormal', help="channel capacity distribution")
+    parser.add_argument('--amount', type=int, default=10_000, help="median payment amount")
+    parser.add_argument('--threads', type=int, default=1, help="threads replaying each workload")
+    parser.add_argument('--route-cache', type=int, default=0, help="route cache size (0 disables it)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="measure each network's memory with tracemalloc (slows the build)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for networks and workloads")
+    parser.add_argument('--output', help="write results as JSON to this path")
+    parser.add_argument('--baseline', help="JSON results to compare against; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed fractional change of each compared metric versus the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.networks, args.workloads, args.nodes, args.channels, args.payments,
+                             args.capacity, args.amount, args.threads, args.route_cache,
+                             args.trace_memory, args.seed)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'timestamp': int(time.time()),
+                'config': vars(args),
+                'results': results
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,34 @@
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, List, Dict, Optional, Sequence, Tuple, Union
+import gc
 import hashlib
+import heapq
+import math
+import os
+import sys
+import threading
 import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 
+SCHNORR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Day14_schnorr_signatures')
+
+def _schnorr_signature_class():
+    """SchnorrSignature from the sibling Day14_schnorr_signatures directory, imported on first use
+
+    The directory is only added to sys.path if schnorr is not importable
+    already, and appended rather than prepended: Day14 also has a
+    benchmark.py that must not shadow this directory's modules.
+    """
+    try:
+        from schnorr import SchnorrSignature
+    except ImportError:
+        if SCHNORR_DIRECTORY not in sys.path:
+            sys.path.append(SCHNORR_DIRECTORY)
+        from schnorr import SchnorrSignature
+    return SchnorrSignature
+
 @dataclass
 class PaymentChannel:
     channel_id: str
@@ -11,6 +37,14 @@ class PaymentChannel:
     balance_b: int
     state: str
     sequence: int
+    # Participants' Schnorr public keys; when both are set, closing requires an aggregated signature
+    pubkey_a: Optional[Tuple[int, int]] = None
+    pubkey_b: Optional[Tuple[int, int]] = None
+    # Forwarding fee: base_fee + amount * fee_rate / 1_000_000
+    base_fee: int = 0
+    fee_rate: int = 0
+    participant_a: str = ''
+    participant_b: str = ''
 
 @dataclass
 class StateUpdate:
@@ -20,18 +54,342 @@ class StateUpdate:
     balance_b: int
     timestamp: int
 
-class Layer2Protocol:
+class ChannelUpdateLog:
+    """Columnar log of one channel's state updates
+
+    Sequence numbers, balances and timestamps are stored in four int64 arrays
+    (32 bytes per update) instead of one StateUpdate object each; the arrays
+    are only allocated on the first append. With a retention limit the log
+    compacts itself: once twice that many rows are held, all but the newest
+    retention rows are dropped and the last dropped row is kept as snapshot.
+    Rows after a hold() mark are never compacted, so a payment in flight can
+    always roll back to it. len() always counts every update ever appended.
+    """
+
+    __slots__ = ('channel_id', 'retention', 'snapshot', '_offset', '_columns', '_hold')
+
+    def __init__(self, channel_id: str, retention: Optional[int] = None):
+        self.channel_id = channel_id
+        self.retention = retention
+        # Latest update dropped by compaction, if any
+        self.snapshot: Optional[StateUpdate] = None
+        self._offset = 0      # updates dropped by compaction
+        self._columns = None  # (sequence, balance_a, balance_b, timestamp) arrays
+        self._hold = None     # length compaction must not cut below while a rollback is possible
+
+    def append(self, update: StateUpdate) -> None:
+        self.append_values(update.sequence, update.balance_a, update.balance_b, update.timestamp)
+
+    def append_values(self, sequence: int, balance_a: int, balance_b: int, timestamp: int) -> None:
+        """append() without building a StateUpdate first"""
+        if self._columns is None:
+            self._columns = (array('q'), array('q'), array('q'), array('q'))
+        columns = self._columns
+        columns[0].append(sequence)
+        columns[1].append(balance_a)
+        columns[2].append(balance_b)
+        columns[3].append(timestamp)
+        if self.retention is not None and len(columns[0]) >= 2 * max(self.retention, 1):
+            self.compact(self.retention)
+
+    def _retained(self) -> int:
+        return len(self._columns[0]) if self._columns is not None else 0
+
+    def compact(self, keep: int) -> None:
+        """Drop all but the newest keep rows, remembering the last dropped one as snapshot"""
+        drop = self._retained() - keep
+        if self._hold is not None:
+            drop = min(drop, self._hold - self._offset)
+        if drop <= 0:
+            return
+        self.snapshot = self._row(drop - 1)
+        for column in self._columns:
+            del column[:drop]
+        self._offset += drop
+
+    def _row(self, i: int) -> StateUpdate:
+        sequence, balance_a, balance_b, timestamp = self._columns
+        return StateUpdate(self.channel_id, sequence[i], balance_a[i], balance_b[i], timestamp[i])
+
+    def __len__(self) -> int:
+        return self._offset + self._retained()
+
+    def __getitem__(self, index: int) -> StateUpdate:
+        """Update by position in the full history; compacted positions raise IndexError"""
+        if index < 0:
+            index += len(self)
+        if not self._offset <= index < len(self):
+            raise IndexError(f"update {index} is not retained")
+        return self._row(index - self._offset)
+
+    def __iter__(self):
+        """Retained updates, oldest first"""
+        for i in range(self._retained()):
+            yield self._row(i)
+
+    def __delitem__(self, index: slice) -> None:
+        """Only del log[n:] is supported: roll the log back to n updates"""
+        if not isinstance(index, slice) or index.stop is not None or index.step is not None:
+            raise TypeError("ChannelUpdateLog only supports del log[n:]")
+        start = index.start or 0
+        if start < self._offset:
+            raise ValueError(f"Cannot roll back into compacted history of {self.channel_id}")
+        if self._columns is not None:
+            for column in self._columns:
+                del column[start - self._offset:]
+
+    def hold(self) -> int:
+        """Keep every row from the current length on until release(); returns that length"""
+        self._hold = len(self)
+        return self._hold
+
+    def release(self) -> None:
+        self._hold = None
+        if self.retention is not None and self._retained() >= 2 * max(self.retention, 1):
+            self.compact(self.retention)
+
+    def reset(self, count: int, snapshot: Optional[StateUpdate] = None) -> None:
+        """Discard retained rows and continue as if count updates, the last being snapshot, were compacted"""
+        self._columns = None
+        self._offset = count
+        self.snapshot = snapshot
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        if self._retained():
+            return self._columns[3][-1]
+        return self.snapshot.timestamp if self.snapshot is not None else None
+
+@contextmanager
+def gc_paused():
+    """Disable the cyclic garbage collector for the block, then restore its previous state
+
+    Bulk loads and log replays allocate millions of acyclic objects, which
+    cyclic collection passes would scan for nothing.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def hop_cost(channel: PaymentChannel, amount: int) -> float:
+    """Every hop costs the same: shortest path by hop count"""
+    return 1.0
+
+def fee_cost(channel: PaymentChannel, amount: int) -> float:
+    """Forwarding fee charged by the channel for this amount"""
+    return channel.base_fee + amount * channel.fee_rate / 1_000_000
+
+def failure_cost(channel: PaymentChannel, amount: int) -> float:
+    """-log of the success probability, assuming liquidity is uniform over the capacity"""
+    success = (channel.capacity + 1 - amount) / (channel.capacity + 1)
+    return -math.log(success) if success > 0 else math.inf
+
+ROUTING_COSTS = {
+    'hops': hop_cost,
+    'fee': fee_cost,
+    'probability': failure_cost
+}
+
+class LiquidityIndex:
+    """Directed spendable balance of every open channel, per node
+
+    Edges are keyed by channel_id, so parallel channels between the same two
+    nodes are indexed side by side. Each node's outgoing edges are also
+    bucketed by the bit length of their spendable balance, so a query for an
+    amount skips every edge in a lower bucket without looking at it.
+    """
+
     def __init__(self):
+        self._edges = {}    # node -> {channel_id: (neighbour, spendable)}
+        self._buckets = {}  # node -> {spendable.bit_length(): set of channel_ids}
+
+    def set(self, node: str, neighbour: str, channel_id: str, spendable: int) -> None:
+        edges = self._edges.setdefault(node, {})
+        buckets = self._buckets.setdefault(node, {})
+        old = edges.get(channel_id)
+        if old is not None:
+            self._discard(buckets, old[1].bit_length(), channel_id)
+        edges[channel_id] = (neighbour, spendable)
+        buckets.setdefault(spendable.bit_length(), set()).add(channel_id)
+
+    def remove(self, node: str, channel_id: str) -> None:
+        edges = self._edges.get(node)
+        if not edges or channel_id not in edges:
+            return
+        _, spendable = edges.pop(channel_id)
+        self._discard(self._buckets[node], spendable.bit_length(), channel_id)
+
+    @staticmethod
+    def _discard(buckets: Dict[int, set], bucket: int, channel_id: str) -> None:
+        members = buckets[bucket]
+        members.discard(channel_id)
+        if not members:
+            del buckets[bucket]
+
+    def spendable(self, node: str, neighbour: str) -> int:
+        """Total amount node can currently send to neighbour over its open channels"""
+        edges = self._edges.get(node, {})
+        return sum(spendable for other, spendable in edges.values() if other == neighbour)
+
+    def incoming(self, node: str) -> int:
+        """Total amount node's neighbours can currently send to it"""
+        edges = self._edges.get(node, {})
+        return sum(self._edges[neighbour][channel_id][1] for channel_id, (neighbour, _) in edges.items())
+
+    def channels(self, node: str) -> List[Tuple[str, str]]:
+        """(neighbour, channel_id) for every open channel of node, whatever its balance"""
+        return [(neighbour, channel_id) for channel_id, (neighbour, _) in self._edges.get(node, {}).items()]
+
+    def neighbours(self, node: str, amount: int) -> List[Tuple[str, str, int]]:
+        """(neighbour, channel_id, spendable) for every edge that can forward amount"""
+        edges = self._edges.get(node)
+        if not edges:
+            return []
+        threshold = amount.bit_length()
+        result = []
+        for bucket, members in self._buckets[node].items():
+            if bucket < threshold:
+                continue
+            for channel_id in members:
+                neighbour, spendable = edges[channel_id]
+                # Only the boundary bucket can hold balances below amount
+                if bucket > threshold or spendable >= amount:
+                    result.append((neighbour, channel_id, spendable))
+        return result
+
+class RouteCache:
+    """LRU cache of payment routes keyed by (source, destination, amount bucket, cost, max_hops)
+
+    The amount bucket is amount.bit_length(). Routes are indexed by channel so
+    a channel change only re-checks the routes that use it.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._routes = OrderedDict()  # key -> path
+        self._by_channel = {}         # channel_id -> set of keys
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def bucket_floor(bucket: int) -> int:
+        """Smallest amount that falls into a bucket"""
+        return 1 << (bucket - 1) if bucket else 0
+
+    def lookup(self, key: Tuple, is_usable: Callable[[List[str]], bool]) -> Optional[List[str]]:
+        """Return the cached path for key if is_usable(path), counting a hit or a miss"""
+        path = self._routes.get(key)
+        if path is not None and is_usable(path):
+            self._routes.move_to_end(key)
+            self.hits += 1
+            return list(path)
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, path: List[str]) -> None:
+        self._discard(key)
+        self._routes[key] = tuple(path)
+        for channel_id in path:
+            self._by_channel.setdefault(channel_id, set()).add(key)
+        if len(self._routes) > self.max_entries:
+            oldest = next(iter(self._routes))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _discard(self, key: Tuple) -> None:
+        path = self._routes.pop(key, None)
+        if path is None:
+            return
+        for channel_id in path:
+            keys = self._by_channel.get(channel_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_channel[channel_id]
+
+    def invalidate_channel(self, channel_id: str, still_valid: Callable[[Tuple, List[str]], bool]) -> None:
+        """Drop the routes through channel_id that still_valid(key, path) rejects"""
+        for key in list(self._by_channel.get(channel_id, ())):
+            if not still_valid(key, list(self._routes[key])):
+                self._discard(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._routes.clear()
+        self._by_channel.clear()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._routes),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+class Layer2Protocol:
+    def __init__(
+        self,
+        route_cache_size: int = 0,
+        update_log_retention: Optional[int] = 1024,
+        wal=None,
+        metrics=None
+    ):
+        if update_log_retention is not None and update_log_retention < 1:
+            raise ValueError("update_log_retention must be at least 1 (or None to keep the full history)")
         self.channels = {}
+        # channel_id -> ChannelUpdateLog; None retention keeps the full history
         self.state_updates = {}
+        self.update_log_retention = update_log_retention
         self.routing_table = {}
+        self.liquidity = LiquidityIndex()
+        # Opt-in cache for routes between hot (source, destination) pairs
+        self.route_cache = RouteCache(route_cache_size) if route_cache_size > 0 else None
+        # Created on first use, so only settlement signing pulls in the schnorr module
+        self._schnorr = None
+        # One re-entrant lock per channel (created on first use), always acquired in sorted channel_id order.
+        # _graph_lock guards the shared structures (channel set, routing table,
+        # liquidity index, route cache) and is only ever taken after channel locks.
+        self._channel_locks = {}
+        self._graph_lock = threading.RLock()
+        # Optional layer2_metrics.Metrics; when None, instrumentation costs one check per operation
+        self.metrics = metrics
+        # Optional channel_wal.WriteAheadLog: existing state is replayed, then every change is logged
+        self.wal = wal
+        # Per-thread depth of deferred_sync() blocks; _wal_sync waits only outside them
+        self._sync_deferral = threading.local()
+        if wal is not None:
+            wal.replay(self)
+
+    @property
+    def schnorr(self):
+        """SchnorrSignature used for aggregated settlement signatures"""
+        if self._schnorr is None:
+            self._schnorr = _schnorr_signature_class()()
+        return self._schnorr
 
     def create_payment_channel(
         self,
         channel_id: str,
         capacity: int,
         participant_a: str,
-        participant_b: str
+        participant_b: str,
+        pubkey_a: Optional[Tuple[int, int]] = None,
+        pubkey_b: Optional[Tuple[int, int]] = None,
+        base_fee: int = 0,
+        fee_rate: int = 0
     ) -> PaymentChannel:
         """Create a new payment channel"""
         channel = PaymentChannel(
@@ -40,19 +398,177 @@ class Layer2Protocol:
             balance_a=capacity,
             balance_b=0,
             state='OPEN',
-            sequence=0
+            sequence=0,
+            pubkey_a=pubkey_a,
+            pubkey_b=pubkey_b,
+            base_fee=base_fee,
+            fee_rate=fee_rate,
+            participant_a=participant_a,
+            participant_b=participant_b
         )
         
+        with self._graph_lock:
+            log = ChannelUpdateLog(channel_id, self.update_log_retention)
+            self._add_channel(channel, log)
+            self._index_channel(channel)
+            if self.route_cache is not None:
+                # A new channel can make a cheaper route available between any pair
+                self.route_cache.clear()
+            if self.wal is not None:
+                self.wal.log_channel(channel, log)
+        self._wal_sync()
+        
+        return channel
+
+    def load_channels(self, definitions: Iterable[Sequence]) -> int:
+        """Create many channels in one pass; returns the number loaded
+
+        Each definition is (channel_id, capacity, participant_a, participant_b,
+        balance_a, base_fee, fee_rate), where the last three may be omitted
+        (balance_a defaults to the full capacity, as in create_payment_channel).
+        All definitions are validated before any channel is added, so a bad one
+        leaves the network unchanged.
+        """
+        retention = self.update_log_retention
+        with gc_paused():
+            channels = []
+            seen = set()
+            nodes = {}
+            for definition in definitions:
+                channel_id, capacity, participant_a, participant_b, *rest = definition
+                balance_a = rest[0] if rest and rest[0] is not None else capacity
+                base_fee = rest[1] if len(rest) > 1 else 0
+                fee_rate = rest[2] if len(rest) > 2 else 0
+                if channel_id in seen or channel_id in self.channels:
+                    raise ValueError(f"Channel {channel_id} already exists")
+                if not 0 <= balance_a <= capacity:
+                    raise ValueError(f"Channel {channel_id} balance {balance_a} is outside 0..{capacity}")
+                seen.add(channel_id)
+                # Share one string object per node name across the channel, routing and index dicts
+                participant_a = nodes.setdefault(participant_a, participant_a)
+                participant_b = nodes.setdefault(participant_b, participant_b)
+                channels.append(PaymentChannel(channel_id, capacity, balance_a, capacity - balance_a, 'OPEN', 0,
+                                               None, None, base_fee, fee_rate, participant_a, participant_b))
+            del seen, nodes
+
+            with self._graph_lock:
+                all_channels = self.channels
+                logs = self.state_updates
+                routing_table = self.routing_table
+                set_liquidity = self.liquidity.set
+                wal = self.wal
+                for channel in channels:
+                    channel_id, a, b = channel.channel_id, channel.participant_a, channel.participant_b
+                    log = ChannelUpdateLog(channel_id, retention)
+                    all_channels[channel_id] = channel
+                    logs[channel_id] = log
+                    neighbours = routing_table.get(a)
+                    if neighbours is None:
+                        neighbours = routing_table[a] = {}
+                    neighbours[b] = channel_id
+                    neighbours = routing_table.get(b)
+                    if neighbours is None:
+                        neighbours = routing_table[b] = {}
+                    neighbours[a] = channel_id
+                    set_liquidity(a, b, channel_id, channel.balance_a)
+                    set_liquidity(b, a, channel_id, channel.balance_b)
+                    if wal is not None:
+                        wal.log_channel(channel, log)
+                if self.route_cache is not None:
+                    self.route_cache.clear()
+        self._wal_sync()
+        return len(channels)
+
+    def _add_channel(self, channel: PaymentChannel, log: ChannelUpdateLog) -> None:
+        """Register channel and its update log; the caller indexes it and holds _graph_lock if shared"""
+        channel_id = channel.channel_id
+        participant_a, participant_b = channel.participant_a, channel.participant_b
         self.channels[channel_id] = channel
-        self.state_updates[channel_id] = []
+        self.state_updates[channel_id] = log
         
         # Initialize routing
         self.routing_table[participant_a] = self.routing_table.get(participant_a, {})
         self.routing_table[participant_b] = self.routing_table.get(participant_b, {})
         self.routing_table[participant_a][participant_b] = channel_id
         self.routing_table[participant_b][participant_a] = channel_id
-        
-        return channel
+
+    def _log_updates(self, updates: List[StateUpdate]) -> None:
+        """Append updates to the WAL as one atomic record (channel locks held)"""
+        if self.wal is not None and updates:
+            self.wal.log_updates(updates)
+
+    def _wal_sync(self) -> None:
+        """Wait for logged changes to be durable; called after channel locks are released"""
+        if self.wal is not None and not getattr(self._sync_deferral, 'depth', 0):
+            self.wal.sync()
+
+    @contextmanager
+    def deferred_sync(self):
+        """Wait for durability once when the block exits, not after every change made in it
+
+        Only changes made by the calling thread are deferred. Callers must not
+        report a change inside the block as durable before the block exits.
+        """
+        depth = getattr(self._sync_deferral, 'depth', 0)
+        self._sync_deferral.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._sync_deferral.depth = depth
+            if not depth:
+                self._wal_sync()
+
+    @contextmanager
+    def _locked(self, channel_ids: List[str]):
+        """Hold the locks of channel_ids, acquired in sorted order so concurrent payments cannot deadlock"""
+        locks = [self._channel_lock(channel_id) for channel_id in sorted(set(channel_ids))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _channel_lock(self, channel_id: str) -> threading.RLock:
+        lock = self._channel_locks.get(channel_id)
+        if lock is None:
+            # setdefault is atomic, so threads racing here still end up sharing one lock
+            lock = self._channel_locks.setdefault(channel_id, threading.RLock())
+        return lock
+
+    def _index_channel(self, channel: PaymentChannel) -> None:
+        """Refresh both directions of a channel in the liquidity index"""
+        a, b = channel.participant_a, channel.participant_b
+        if channel.state == 'OPEN':
+            self.liquidity.set(a, b, channel.channel_id, channel.balance_a)
+            self.liquidity.set(b, a, channel.channel_id, channel.balance_b)
+        else:
+            self.liquidity.remove(a, channel.channel_id)
+            self.liquidity.remove(b, channel.channel_id)
+
+    def _channel_changed(self, channel: PaymentChannel) -> None:
+        """Propagate a balance or state change to the liquidity index and route cache"""
+        with self._graph_lock:
+            self._index_channel(channel)
+            if self.route_cache is not None:
+                # Keep cached routes that can still forward the smallest amount of their bucket
+                self.route_cache.invalidate_channel(
+                    channel.channel_id,
+                    lambda key, path: self._path_can_forward(path, key[0], RouteCache.bucket_floor(key[2]))
+                )
+
+    def _path_can_forward(self, path: List[str], source: str, amount: int) -> bool:
+        """True if every hop of path, entered from source, can currently forward amount"""
+        hops = self._resolve_hops(path, source)
+        if hops is None:
+            return False
+        for channel, a_pays in hops:
+            if channel.state != 'OPEN':
+                return False
+            if (channel.balance_a if a_pays else channel.balance_b) < amount:
+                return False
+        return True
 
     def update_channel_state(
         self,
@@ -61,10 +577,36 @@ class Layer2Protocol:
         new_balance_b: int
     ) -> StateUpdate:
         """Update channel state with new balances"""
+        if self.metrics is None:
+            return self._update_channel_state(channel_id, new_balance_a, new_balance_b)
+        start = time.perf_counter()
+        try:
+            update = self._update_channel_state(channel_id, new_balance_a, new_balance_b)
+        except ValueError:
+            self.metrics.operation('update_channel_state', start, False)
+            raise
+        self.metrics.operation('update_channel_state', start, True)
+        return update
+
+    def _update_channel_state(self, channel_id: str, new_balance_a: int, new_balance_b: int) -> StateUpdate:
         if channel_id not in self.channels:
             raise ValueError(f"Channel {channel_id} not found")
             
         channel = self.channels[channel_id]
+        with self._locked([channel_id]):
+            update = self._record_update(channel, new_balance_a, new_balance_b)
+            self._log_updates([update])
+        self._wal_sync()
+        return update
+
+    def _record_update(
+        self,
+        channel: PaymentChannel,
+        new_balance_a: int,
+        new_balance_b: int
+    ) -> StateUpdate:
+        """Apply and record one state update; the caller holds the channel lock"""
+        channel_id = channel.channel_id
         if channel.state != 'OPEN':
             raise ValueError(f"Channel {channel_id} is not open")
             
@@ -86,99 +628,511 @@ class Layer2Protocol:
         channel.sequence += 1
         
         self.state_updates[channel_id].append(update)
+        self._channel_changed(channel)
         return update
 
     def find_payment_path(
         self,
         source: str,
         destination: str,
-        amount: int
+        amount: int,
+        cost: Union[str, Callable[[PaymentChannel, int], float]] = 'hops',
+        max_hops: int = 20
     ) -> Optional[List[str]]:
-        """Find payment path between source and destination"""
-        def dfs(current: str, target: str, path: List[str], visited: set) -> Optional[List[str]]:
-            if current == target:
-                return path
-                
-            visited.add(current)
-            for next_hop, channel_id in self.routing_table[current].items():
-                if next_hop not in visited:
-                    channel = self.channels[channel_id]
-                    # Check capacity
-                    if channel.balance_a >= amount or channel.balance_b >= amount:
-                        result = dfs(next_hop, target, path + [channel_id], visited)
-                        if result:
-                            return result
-            visited.remove(current)
+        """Find the cheapest payment path between source and destination
+
+        Dijkstra over (node, hop count) labels with a priority queue. cost is
+        one of ROUTING_COSTS ('hops', 'fee', 'probability') or a callable
+        returning a non-negative cost for (channel, amount). Paths longer than
+        max_hops are never returned.
+        """
+        if self.metrics is None:
+            return self._find_payment_path(source, destination, amount, cost, max_hops)
+        start = time.perf_counter()
+        path = self._find_payment_path(source, destination, amount, cost, max_hops)
+        if path is None:
+            self.metrics.operation('find_payment_path', start, False)
+        else:
+            self.metrics.operation('find_payment_path', start, True, depth=len(path))
+        return path
+
+    def _find_payment_path(
+        self,
+        source: str,
+        destination: str,
+        amount: int,
+        cost: Union[str, Callable[[PaymentChannel, int], float]],
+        max_hops: int
+    ) -> Optional[List[str]]:
+        if source not in self.routing_table or destination not in self.routing_table:
             return None
-            
-        return dfs(source, destination, [], set())
+        if source == destination:
+            return []
+        if self.route_cache is not None:
+            key = (source, destination, amount.bit_length(), cost, max_hops)
+            with self._graph_lock:
+                path = self.route_cache.lookup(key, lambda p: self._path_can_forward(p, source, amount))
+            if path is None:
+                path = self._search_path(source, destination, amount, cost, max_hops)
+                if path:
+                    with self._graph_lock:
+                        self.route_cache.put(key, path)
+            return path
+        return self._search_path(source, destination, amount, cost, max_hops)
 
-    def execute_multi_hop_payment(
+    def _search_path(
+        self,
+        source: str,
+        destination: str,
+        amount: int,
+        cost: Union[str, Callable[[PaymentChannel, int], float]],
+        max_hops: int
+    ) -> Optional[List[str]]:
+        """Priority-queue search behind find_payment_path"""
+        cost_fn = ROUTING_COSTS[cost] if isinstance(cost, str) else cost
+
+        # Labels are stored in parallel lists; the path is rebuilt from parent pointers
+        label_node = [source]
+        label_channel = [None]
+        label_parent = [-1]
+        # A node is expanded again only if reached with strictly fewer hops than before,
+        # since a cheaper label with at most as many hops dominates it
+        fewest_hops = {}
+        heap = [(0.0, 0, 0)]
+        expanded = 0
+
+        while heap:
+            total, hops, label = heapq.heappop(heap)
+            current = label_node[label]
+            if current == destination:
+                path = []
+                while label_parent[label] != -1:
+                    path.append(label_channel[label])
+                    label = label_parent[label]
+                path.reverse()
+                if self.metrics is not None:
+                    self.metrics.observe('find_payment_path.nodes_expanded', expanded)
+                return path
+            if fewest_hops.get(current, max_hops + 1) <= hops:
+                continue
+            fewest_hops[current] = hops
+            expanded += 1
+            if hops == max_hops:
+                continue
+
+            # The index only returns open channels that can send amount in this direction
+            with self._graph_lock:
+                edges = self.liquidity.neighbours(current, amount)
+            for next_hop, channel_id, _ in edges:
+                if fewest_hops.get(next_hop, max_hops + 1) <= hops + 1:
+                    continue
+                channel = self.channels[channel_id]
+                edge_cost = cost_fn(channel, amount)
+                if edge_cost == math.inf:
+                    continue
+                label_node.append(next_hop)
+                label_channel.append(channel_id)
+                label_parent.append(label)
+                heapq.heappush(heap, (total + edge_cost, hops + 1, len(label_node) - 1))
+
+        if self.metrics is not None:
+            self.metrics.observe('find_payment_path.nodes_expanded', expanded)
+        return None
+
+    def _resolve_hops(
         self,
         path: List[str],
-        amount: int
-    ) -> bool:
-        """Execute payment across multiple channels"""
-        # Verify path exists
+        source: Optional[str]
+    ) -> Optional[List[Tuple[PaymentChannel, bool]]]:
+        """Pair each channel on path with its direction (True = a pays b)"""
+        channels = []
         for channel_id in path:
             if channel_id not in self.channels:
-                return False
-                
-        # Create state updates for each channel
+                return None
+            channels.append(self.channels[channel_id])
+        if not channels:
+            return []
+
+        current = source
+        if current is None:
+            # Infer the entry node from the node the first two channels share
+            first = channels[0]
+            if len(channels) == 1:
+                current = first.participant_a
+            else:
+                shared = (channels[1].participant_a, channels[1].participant_b)
+                current = first.participant_a if first.participant_b in shared else first.participant_b
+
+        hops = []
+        for channel in channels:
+            if current == channel.participant_a:
+                hops.append((channel, True))
+                current = channel.participant_b
+            elif current == channel.participant_b:
+                hops.append((channel, False))
+                current = channel.participant_a
+            else:
+                return None
+        return hops
+
+    def _snapshot(self, channels: List[PaymentChannel]) -> List[Tuple]:
+        """Record balances and log lengths of channels so a failed payment can be rolled back
+
+        The logs are held until _release or _restore, so compaction cannot drop
+        the rows a rollback would truncate.
+        """
+        seen = {}
+        for channel in channels:
+            if channel.channel_id not in seen:
+                seen[channel.channel_id] = (channel, channel.balance_a, channel.balance_b, channel.sequence,
+                                            self.state_updates[channel.channel_id].hold())
+        return list(seen.values())
+
+    def _release(self, snapshot: List[Tuple]) -> None:
+        """Let the logs of a snapshot that will not be restored compact again"""
+        for channel, *_ in snapshot:
+            self.state_updates[channel.channel_id].release()
+
+    def _restore(self, snapshot: List[Tuple]) -> None:
+        """Revert channels to a snapshot taken by _snapshot"""
+        for channel, balance_a, balance_b, sequence, log_length in snapshot:
+            channel.balance_a = balance_a
+            channel.balance_b = balance_b
+            channel.sequence = sequence
+            log = self.state_updates[channel.channel_id]
+            del log[log_length:]
+            log.release()
+            self._channel_changed(channel)
+
+    def _apply_hops(self, hops: List[Tuple[PaymentChannel, bool]], amount: int) -> List[StateUpdate]:
+        """Move amount across each hop; raises ValueError on the first hop that cannot forward it"""
         updates = []
-        try:
-            for channel_id in path:
-                channel = self.channels[channel_id]
+        for channel, a_pays in hops:
+            if a_pays:
                 new_balance_a = channel.balance_a - amount
                 new_balance_b = channel.balance_b + amount
-                if new_balance_a < 0 or new_balance_b > channel.capacity:
-                    raise ValueError("Insufficient capacity")
-                    
-                update = self.update_channel_state(
-                    channel_id,
-                    new_balance_a,
-                    new_balance_b
-                )
-                updates.append(update)
-            return True
-            
-        except Exception as e:
-            # Revert updates on failure
-            for i, channel_id in enumerate(path):
-                if i < len(updates):
+            else:
+                new_balance_a = channel.balance_a + amount
+                new_balance_b = channel.balance_b - amount
+            if new_balance_a < 0 or new_balance_b < 0:
+                raise ValueError("Insufficient capacity")
+                
+            updates.append(self._record_update(
+                channel,
+                new_balance_a,
+                new_balance_b
+            ))
+        return updates
+
+    def execute_multi_hop_payment(
+        self,
+        path: List[str],
+        amount: int,
+        source: Optional[str] = None
+    ) -> bool:
+        """Execute payment across multiple channels
+
+        Each hop moves amount from the side the payment enters on to the other
+        side. source is the paying node; if omitted it is inferred from the path.
+        """
+        if self.metrics is None:
+            return self._execute_multi_hop_payment(path, amount, source)
+        start = time.perf_counter()
+        ok = self._execute_multi_hop_payment(path, amount, source)
+        self.metrics.operation('execute_multi_hop_payment', start, ok, hops=len(path))
+        return ok
+
+    def _execute_multi_hop_payment(self, path: List[str], amount: int, source: Optional[str]) -> bool:
+        hops = self._resolve_hops(path, source)
+        if hops is None:
+            return False
+
+        # Balances are re-checked under the channel locks, so a stale route just fails
+        with self._locked([channel.channel_id for channel, _ in hops]):
+            snapshot = self._snapshot([channel for channel, _ in hops])
+            try:
+                updates = self._apply_hops(hops, amount)
+                
+            except ValueError:
+                # Revert updates on failure
+                self._restore(snapshot)
+                if self.metrics is not None:
+                    self.metrics.count('execute_multi_hop_payment.rollbacks')
+                return False
+            self._release(snapshot)
+            # Only completed payments reach the log, as a single record
+            self._log_updates(updates)
+        self._wal_sync()
+        return True
+
+    def find_multi_path_payment(
+        self,
+        source: str,
+        destination: str,
+        amount: int,
+        max_parts: int = 16,
+        max_augmentations: int = 256
+    ) -> Optional[List[Tuple[List[str], int]]]:
+        """Split a payment over several routes with a min-cost flow
+
+        Successive shortest augmenting paths (Dijkstra with Johnson potentials)
+        send amount from source to destination over the directed spendable
+        balances, each hop costing 1. Pushing against existing flow on a channel
+        cancels it at cost -1. The flow is then decomposed into (path, part_amount)
+        pairs. Returns None if amount cannot be routed in at most max_parts parts.
+        """
+        if amount <= 0 or source == destination:
+            return None
+        if source not in self.routing_table or destination not in self.routing_table:
+            return None
+
+        # Cheap cut bounds: the source's outgoing and the destination's incoming liquidity
+        with self._graph_lock:
+            outgoing = sum(spendable for _, _, spendable in self.liquidity.neighbours(source, 1))
+            incoming = self.liquidity.incoming(destination)
+        if outgoing < amount or incoming < amount:
+            return None
+
+        # net[channel_id] > 0 means flow from participant_a to participant_b
+        net = {}
+        # Potentials: pi(v) = stored.get(v, 0) + offset; only settled nodes are stored explicitly
+        stored = {}
+        offset = 0
+        sent = 0
+
+        def residual(node: str, channel: PaymentChannel) -> Tuple[int, int]:
+            """(capacity, cost) of the cheapest residual arc out of node over channel"""
+            a_side = node == channel.participant_a
+            flow = net.get(channel.channel_id, 0)
+            if not a_side:
+                flow = -flow
+            if flow < 0:
+                return -flow, -1
+            return (channel.balance_a if a_side else channel.balance_b) - flow, 1
+
+        for _ in range(max_augmentations):
+            if sent == amount:
+                break
+            dist = {source: 0}
+            parent = {}
+            settled = set()
+            heap = [(0, source)]
+            while heap:
+                d, node = heapq.heappop(heap)
+                if node in settled:
+                    continue
+                settled.add(node)
+                if node == destination:
+                    break
+                pi_node = stored.get(node, 0) + offset
+                with self._graph_lock:
+                    edges = self.liquidity.channels(node)
+                for next_hop, channel_id in edges:
+                    if next_hop in settled:
+                        continue
                     channel = self.channels[channel_id]
-                    channel.balance_a = updates[i].balance_a
-                    channel.balance_b = updates[i].balance_b
-                    channel.sequence = updates[i].sequence
+                    if channel.state != 'OPEN':
+                        continue
+                    capacity, arc_cost = residual(node, channel)
+                    if capacity <= 0:
+                        continue
+                    reduced = arc_cost + pi_node - (stored.get(next_hop, 0) + offset)
+                    candidate = d + reduced
+                    if candidate < dist.get(next_hop, math.inf):
+                        dist[next_hop] = candidate
+                        parent[next_hop] = (node, channel)
+                        heapq.heappush(heap, (candidate, next_hop))
+            if destination not in settled:
+                break
+
+            # Augment along the path by its bottleneck
+            arcs = []
+            node = destination
+            while node != source:
+                previous, channel = parent[node]
+                arcs.append((previous, channel))
+                node = previous
+            push = amount - sent
+            for previous, channel in arcs:
+                push = min(push, residual(previous, channel)[0])
+            for previous, channel in arcs:
+                delta = push if previous == channel.participant_a else -push
+                net[channel.channel_id] = net.get(channel.channel_id, 0) + delta
+            sent += push
+
+            # Keep reduced costs non-negative: settled nodes move by dist, everyone else by dist[destination]
+            limit = dist[destination]
+            for node in settled:
+                stored[node] = stored.get(node, 0) + dist[node] - limit
+            offset += limit
+
+        if sent < amount:
+            return None
+        return self._decompose_flow(source, destination, net, max_parts)
+
+    def _decompose_flow(
+        self,
+        source: str,
+        destination: str,
+        net: Dict[str, int],
+        max_parts: int
+    ) -> Optional[List[Tuple[List[str], int]]]:
+        """Turn per-channel net flow into (path, amount) parts from source to destination"""
+        outgoing = {}
+        for channel_id, flow in net.items():
+            if flow == 0:
+                continue
+            channel = self.channels[channel_id]
+            if flow > 0:
+                tail, head = channel.participant_a, channel.participant_b
+            else:
+                tail, head = channel.participant_b, channel.participant_a
+            outgoing.setdefault(tail, {})[channel_id] = [head, abs(flow)]
+
+        parts = []
+        while outgoing.get(source):
+            path = []
+            node = source
+            # Min-cost flow with positive hop costs has no cycles, so every walk reaches destination
+            while node != destination:
+                channel_id, arc = next(iter(outgoing[node].items()))
+                path.append((node, channel_id, arc))
+                node = arc[0]
+            part = min(arc[1] for _, _, arc in path)
+            for tail, channel_id, arc in path:
+                arc[1] -= part
+                if arc[1] == 0:
+                    del outgoing[tail][channel_id]
+            parts.append(([channel_id for _, channel_id, _ in path], part))
+            if len(parts) > max_parts:
+                return None
+        return parts
+
+    def execute_multi_path_payment(
+        self,
+        source: str,
+        destination: str,
+        amount: int,
+        max_parts: int = 16
+    ) -> bool:
+        """Route amount over several paths and execute every part atomically"""
+        parts = self.find_multi_path_payment(source, destination, amount, max_parts)
+        if parts is None:
             return False
 
+        resolved = []
+        for path, part_amount in parts:
+            hops = self._resolve_hops(path, source)
+            if hops is None:
+                return False
+            resolved.append((hops, part_amount))
+
+        channels = [channel for hops, _ in resolved for channel, _ in hops]
+        with self._locked([channel.channel_id for channel in channels]):
+            snapshot = self._snapshot(channels)
+            try:
+                updates = []
+                for hops, part_amount in resolved:
+                    updates.extend(self._apply_hops(hops, part_amount))
+            except ValueError:
+                self._restore(snapshot)
+                return False
+            self._release(snapshot)
+            self._log_updates(updates)
+        self._wal_sync()
+        return True
+
+    def settle_batch(self, payments: Iterable[Sequence]) -> bool:
+        """Settle routed payments together, with one state update per touched channel
+
+        Each payment is (path, amount) or (path, amount, source), as for
+        execute_multi_hop_payment. Amounts are netted per channel, so only the
+        final balances must fit the capacity: payments in opposite directions
+        can settle together even if one of them could not go first on its own.
+        Either every payment settles or none does.
+        """
+        deltas = {}   # channel_id -> (channel, change in balance_a)
+        for payment in payments:
+            path, amount = payment[0], payment[1]
+            source = payment[2] if len(payment) > 2 else None
+            if amount <= 0:
+                return False
+            hops = self._resolve_hops(path, source)
+            if hops is None:
+                return False
+            for channel, a_pays in hops:
+                _, delta = deltas.get(channel.channel_id, (channel, 0))
+                deltas[channel.channel_id] = (channel, delta - amount if a_pays else delta + amount)
+
+        with self._locked(list(deltas)):
+            # Validate every netted balance before changing anything
+            for channel, delta in deltas.values():
+                if channel.state != 'OPEN' or not 0 <= channel.balance_a + delta <= channel.capacity:
+                    return False
+            updates = [
+                self._record_update(channel, channel.balance_a + delta, channel.balance_b - delta)
+                for channel, delta in deltas.values() if delta
+            ]
+            self._log_updates(updates)
+        self._wal_sync()
+        return True
+
     def close_channel(
         self,
         channel_id: str,
         settlement_tx: Dict
     ) -> bool:
         """Close payment channel"""
+        if self.metrics is None:
+            return self._close_channel(channel_id, settlement_tx)
+        start = time.perf_counter()
+        ok = self._close_channel(channel_id, settlement_tx)
+        self.metrics.operation('close_channel', start, ok)
+        return ok
+
+    def _close_channel(self, channel_id: str, settlement_tx: Dict) -> bool:
         if channel_id not in self.channels:
             return False
             
         channel = self.channels[channel_id]
-        if channel.state != 'OPEN':
-            return False
-            
-        # Verify settlement transaction
-        if not self._verify_settlement(channel, settlement_tx):
-            return False
-            
-        channel.state = 'CLOSED'
+        with self._locked([channel_id]):
+            if channel.state != 'OPEN':
+                return False
+                
+            # Verify settlement transaction
+            if not self._verify_settlement(channel, settlement_tx):
+                return False
+                
+            channel.state = 'CLOSED'
+            self._channel_changed(channel)
+            if self.wal is not None:
+                self.wal.log_close(channel_id)
+        self._wal_sync()
         return True
 
+    def settlement_message(self, channel_id: str) -> bytes:
+        """Message both participants sign to settle a channel at its current state"""
+        channel = self.channels[channel_id]
+        return f"{channel.channel_id}:{channel.balance_a}:{channel.balance_b}:{channel.sequence}".encode()
+
     def _verify_settlement(self, channel: PaymentChannel, settlement_tx: Dict) -> bool:
         """Verify settlement transaction"""
         # Verify amount distribution
         if settlement_tx.get('amount_a') != channel.balance_a or \
            settlement_tx.get('amount_b') != channel.balance_b:
             return False
-            
+
+        if channel.pubkey_a is not None and channel.pubkey_b is not None:
+            # One MuSig signature under the aggregated channel key replaces sig_a + sig_b
+            if 'signature' not in settlement_tx:
+                return False
+            aggregate_key, _ = self.schnorr.aggregate_public_keys([channel.pubkey_a, channel.pubkey_b])
+            return self.schnorr.verify(
+                aggregate_key,
+                self.settlement_message(channel.channel_id),
+                settlement_tx['signature']
+            )
+
         # Verify signatures (simplified)
         if 'sig_a' not in settlement_tx or 'sig_b' not in settlement_tx:
             return False
@@ -201,7 +1155,7 @@ class Layer2Protocol:
             'state': channel.state,
             'sequence': channel.sequence,
             'update_count': len(updates),
-            'last_update': updates[-1].timestamp if updates else None
+            'last_update': updates.last_timestamp
         }
 
 def main():
@@ -221,12 +1175,220 @@ def main():
     if path:
         print(f"\nFound path: {path}")
         # Execute payment
-        success = l2.execute_multi_hop_payment(path, 100)
+        success = l2.execute_multi_hop_payment(path, 100, source='Alice')
         print(f"Payment {'successful' if success else 'failed'}")
         
         print("\nUpdated Channel States:")
         print(l2.get_channel_state('chan1'))
         print(l2.get_channel_state('chan2'))
 
+    # Net many payments into one state update per channel
+    payments = [(['chan1', 'chan2'], 10, 'Alice')] * 5 + [(['chan2', 'chan1'], 20, 'Charlie')]
+    settled = l2.settle_batch(payments)
+    print(f"\nBatch of {len(payments)} payments {'settled' if settled else 'rejected'}:")
+    print(l2.get_channel_state('chan1'))
+
+    # Close a channel with one aggregated (MuSig) signature from both participants
+    (sk_a, pk_a), (sk_b, pk_b) = l2.schnorr.generate_keypairs(2)
+    l2.create_payment_channel('chan3', 500, 'Alice', 'Dave', pk_a, pk_b)
+    signature = l2.schnorr.musig_sign([sk_a, sk_b], l2.settlement_message('chan3'))
+    closed = l2.close_channel('chan3', {'amount_a': 500, 'amount_b': 0, 'signature': signature})
+    print(f"\nChannel chan3 {'closed' if closed else 'failed to close'} with aggregated signature")
+
+# Tests
+def run_tests():
+    # Test 1: Compaction never drops updates a failed payment rolls back
+    try:
+        Layer2Protocol(update_log_retention=0)
+        assert False, "retention 0 accepted"
+    except ValueError:
+        pass
+    l2 = Layer2Protocol(update_log_retention=1)
+    l2.create_payment_channel('c1', 1000, 'A', 'B')
+    l2.create_payment_channel('c2', 1000, 'A', 'C')
+    for _ in range(3):
+        l2.update_channel_state('c1', 997, 3)
+    # The route updates c1 twice, then fails on c2 where A has nothing left to send
+    l2.update_channel_state('c2', 0, 1000)
+    assert not l2.execute_multi_hop_payment(['c1', 'c1', 'c2'], 100, source='A')
+    state = l2.get_channel_state('c1')
+    assert state['balance_a'] == 997 and state['sequence'] == 3 and state['update_count'] == 3
+    assert l2.liquidity.spendable('A', 'B') == 997 and l2.liquidity.spendable('B', 'A') == 3
+    assert l2.execute_multi_hop_payment(['c1'], 100, source='A')
+    log = l2.state_updates['c1']
+    assert len(log) == 4 and len(list(log)) == 1 and log[-1].balance_a == 897
+    print("Test 1 passed: Rollback with a short update log")
+
+    # Test 2: Parallel channels are indexed separately
+    l2 = Layer2Protocol()
+    l2.create_payment_channel('c1', 1000, 'A', 'B')
+    l2.create_payment_channel('c1b', 5000, 'A', 'B')
+    assert l2.execute_multi_hop_payment(['c1'], 100, source='A')
+    assert l2.liquidity.spendable('A', 'B') == 5900 and l2.liquidity.incoming('B') == 5900
+    assert l2.find_payment_path('A', 'B', 2000) == ['c1b']
+    assert l2.find_payment_path('B', 'A', 100) == ['c1']
+    assert l2.close_channel('c1', {'amount_a': 900, 'amount_b': 100, 'sig_a': b'', 'sig_b': b''})
+    assert l2.find_payment_path('A', 'B', 2000) == ['c1b'] and l2.find_payment_path('B', 'A', 1) is None
+    print("Test 2 passed: Parallel channels")
+
+    # Test 3: Multi-path payments split over routes, respect max_parts and roll back as a whole
+    l2 = Layer2Protocol()
+    l2.create_payment_channel('ab', 600, 'A', 'B')
+    l2.create_payment_channel('bd', 600, 'B', 'D')
+    l2.create_payment_channel('ac', 600, 'A', 'C')
+    l2.create_payment_channel('cd', 500, 'C', 'D')
+    l2.create_payment_channel('bc', 600, 'B', 'C')
+    parts = l2.find_multi_path_payment('A', 'D', 1100)
+    assert sum(amount for _, amount in parts) == 1100 and len(parts) <= 3
+    assert all(path[0] in ('ab', 'ac') and path[-1] in ('bd', 'cd') for path, _ in parts)
+    assert l2.find_multi_path_payment('A', 'D', 1101) is None
+    assert l2.find_multi_path_payment('A', 'D', 1100, max_parts=1) is None
+    assert l2.find_multi_path_payment('A', 'D', 601, max_parts=1) is None
+    assert l2.find_multi_path_payment('A', 'D', 600, max_parts=1) == [(['ab', 'bd'], 600)]
+    # A plan that was valid when found but whose last part no longer fits
+    parts.sort(key=lambda part: part[0][-1] == 'cd')
+    l2.update_channel_state('cd', 499, 1)
+    drained = {cid: l2.get_channel_state(cid) for cid in l2.channels}
+    find = l2.find_multi_path_payment
+    l2.find_multi_path_payment = lambda *args: parts
+    assert not l2.execute_multi_path_payment('A', 'D', 1100)
+    del l2.find_multi_path_payment
+    assert {cid: l2.get_channel_state(cid) for cid in l2.channels} == drained
+    l2.update_channel_state('cd', 500, 0)
+    assert l2.execute_multi_path_payment('A', 'D', 1100)
+    assert l2.channels['bd'].balance_b + l2.channels['cd'].balance_b == 1100
+    assert l2.channels['ab'].balance_a + l2.channels['ac'].balance_a == 100
+    # Parallel channels between the same nodes are separate routes
+    l2 = Layer2Protocol()
+    l2.create_payment_channel('c1', 1000, 'A', 'B')
+    l2.create_payment_channel('c1b', 5000, 'A', 'B')
+    assert l2.execute_multi_hop_payment(['c1'], 100, source='A')
+    parts = l2.find_multi_path_payment('A', 'B', 5500)
+    assert sorted(path for path, _ in parts) == [['c1'], ['c1b']] and sum(amount for _, amount in parts) == 5500
+    assert l2.find_multi_path_payment('A', 'B', 5901) is None
+    assert l2.close_channel('c1b', {'amount_a': 5000, 'amount_b': 0, 'sig_a': b'', 'sig_b': b''})
+    assert l2.execute_multi_path_payment('A', 'B', 900) and l2.channels['c1'].balance_a == 0
+    print("Test 3 passed: Multi-path payments")
+
+    # Test 4: Concurrent payments over overlapping routes keep every channel consistent
+    import random
+    l2 = Layer2Protocol(update_log_retention=4)
+    nodes = [f"n{i}" for i in range(8)]
+    for i, node in enumerate(nodes):
+        l2.create_payment_channel(f"ring{i}", 10_000, node, nodes[(i + 1) % 8])
+        l2.create_payment_channel(f"chord{i}", 10_000, node, nodes[(i + 3) % 8])
+    def holdings():
+        totals = dict.fromkeys(nodes, 0)
+        for channel in l2.channels.values():
+            totals[channel.participant_a] += channel.balance_a
+            totals[channel.participant_b] += channel.balance_b
+        return totals
+    expected = holdings()
+    expected_lock = threading.Lock()
+    errors = []
+    def pay(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(1000):
+                source, destination = rng.sample(nodes, 2)
+                amount = rng.randint(1, 3000)
+                path = l2.find_payment_path(source, destination, amount)
+                if path and l2.execute_multi_hop_payment(path, amount, source):
+                    with expected_lock:
+                        expected[source] -= amount
+                        expected[destination] += amount
+        except Exception as exc:
+            errors.append(exc)
+    threads = [threading.Thread(target=pay, args=(seed,)) for seed in range(8)]
+    # Switch threads as often as possible so payments interleave mid-update
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert not errors and holdings() == expected
+    for channel in l2.channels.values():
+        a, b = channel.participant_a, channel.participant_b
+        assert channel.balance_a + channel.balance_b == channel.capacity
+        assert l2.liquidity.spendable(a, b) == channel.balance_a and l2.liquidity.spendable(b, a) == channel.balance_b
+        assert channel.sequence == len(l2.state_updates[channel.channel_id])
+    assert sum(channel.sequence for channel in l2.channels.values()) > 0
+    print("Test 4 passed: Concurrent payments")
+
+    # Test 5: Cached routes are rechecked on lookup and invalidated by channel changes
+    l2 = Layer2Protocol(route_cache_size=16)
+    l2.create_payment_channel('ab', 1000, 'A', 'B')
+    l2.create_payment_channel('bc', 1000, 'B', 'C')
+    cache = l2.route_cache
+    assert l2.find_payment_path('A', 'C', 600) == ['ab', 'bc'] and cache.misses == 1
+    assert l2.find_payment_path('A', 'C', 700) == ['ab', 'bc'] and cache.hits == 1
+    # 700 left on ab still forwards the bucket floor (512), so the route stays cached...
+    l2.update_channel_state('ab', 700, 300)
+    assert len(cache) == 1 and cache.invalidations == 0
+    # ...but a lookup for more than 700 in the same bucket must not return it
+    assert l2.find_payment_path('A', 'C', 800) is None and cache.hits == 1
+    assert l2.find_payment_path('A', 'C', 600) == ['ab', 'bc'] and cache.hits == 2
+    assert l2.execute_multi_hop_payment(['ab', 'bc'], 300, source='A')
+    assert len(cache) == 0 and cache.invalidations == 1
+    assert l2.find_payment_path('A', 'C', 300) == ['ab', 'bc'] and len(cache) == 1
+    l2.update_channel_state('bc', 0, 1000)
+    assert len(cache) == 0 and cache.invalidations == 2
+    l2.update_channel_state('bc', 1000, 0)
+    assert l2.find_payment_path('A', 'C', 300) == ['ab', 'bc'] and len(cache) == 1
+    assert l2.close_channel('bc', {'amount_a': 1000, 'amount_b': 0, 'sig_a': b'', 'sig_b': b''})
+    assert len(cache) == 0 and cache.invalidations == 3
+    assert l2.find_payment_path('A', 'C', 300) is None
+    # A new channel can offer a better route between any pair, so opening one clears the cache
+    assert l2.find_payment_path('A', 'B', 300) == ['ab'] and len(cache) == 1
+    l2.create_payment_channel('ac', 1000, 'A', 'C')
+    assert len(cache) == 0 and l2.find_payment_path('A', 'C', 300) == ['ac']
+    print("Test 5 passed: Route cache invalidation")
+
+    # Test 6: Batches are netted into one update per channel and settle all-or-nothing
+    l2 = Layer2Protocol()
+    l2.create_payment_channel('ab', 1000, 'A', 'B')
+    l2.create_payment_channel('bc', 1000, 'B', 'C')
+    assert l2.settle_batch([(['ab', 'bc'], 10, 'A')] * 5 + [(['bc', 'ab'], 20, 'C')])
+    assert l2.channels['ab'].balance_a == 970 and l2.channels['bc'].balance_b == 30
+    assert l2.channels['ab'].sequence == 1 and l2.channels['bc'].sequence == 1
+    # C cannot pay 500 first, but netted against A's 600 only 100 crosses each channel
+    assert l2.settle_batch([(['bc', 'ab'], 500, 'C'), (['ab', 'bc'], 600, 'A')])
+    assert l2.channels['ab'].balance_a == 870 and l2.channels['bc'].balance_b == 130
+    # Flows that cancel exactly leave the channel without an update
+    assert l2.settle_batch([(['ab'], 50, 'A'), (['ab'], 50, 'B'), (['bc'], 5, 'B')])
+    assert l2.channels['ab'].sequence == 2 and l2.channels['bc'].sequence == 3
+    before = {cid: l2.get_channel_state(cid) for cid in l2.channels}
+    assert not l2.settle_batch([(['ab'], 10, 'A'), (['bc'], 2000, 'B')])
+    assert not l2.settle_batch([(['ab'], 10, 'A'), (['ab', 'bc'], 0, 'A')])
+    assert not l2.settle_batch([(['ab'], 10, 'A'), (['bc'], 10, 'A')])
+    assert {cid: l2.get_channel_state(cid) for cid in l2.channels} == before
+    print("Test 6 passed: Netted batch settlement")
+
+    # Test 7: Routing costs, the hop limit and cheaper paths with more hops
+    l2 = Layer2Protocol()
+    l2.create_payment_channel('direct', 10_000, 'A', 'D', base_fee=100)
+    l2.create_payment_channel('ab', 10_000, 'A', 'B', base_fee=1)
+    l2.create_payment_channel('bc', 10_000, 'B', 'C', base_fee=1)
+    l2.create_payment_channel('cd', 10_000, 'C', 'D', base_fee=1)
+    l2.create_payment_channel('small', 1_100, 'A', 'E')
+    l2.create_payment_channel('ed', 10_000, 'E', 'D', fee_rate=5000)
+    assert l2.find_payment_path('A', 'D', 1000) == ['direct']
+    assert l2.find_payment_path('A', 'D', 1000, cost='fee') == ['ab', 'bc', 'cd']
+    assert l2.find_payment_path('A', 'D', 1000, cost='fee', max_hops=2) == ['small', 'ed']
+    assert l2.find_payment_path('A', 'D', 2000, cost='fee', max_hops=2) == ['direct']
+    assert l2.find_payment_path('A', 'D', 1000, cost='fee', max_hops=0) is None
+    # 'probability' prefers the hops with the most headroom over the amount: 'small' barely fits
+    assert l2.find_payment_path('A', 'D', 1000, cost='probability', max_hops=2) == ['direct']
+    l2.close_channel('direct', {'amount_a': 10_000, 'amount_b': 0, 'sig_a': b'', 'sig_b': b''})
+    assert l2.find_payment_path('A', 'D', 1000, cost='probability') == ['ab', 'bc', 'cd']
+    assert l2.find_payment_path('A', 'D', 1000, cost='probability', max_hops=2) == ['small', 'ed']
+    assert l2.find_payment_path('A', 'D', 1000, cost=lambda channel, amount: channel.capacity) == ['small', 'ed']
+    print("Test 7 passed: Routing costs and hop limits")
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
+    run_tests()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import csv
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Iterable, Iterator, Sequence, Tuple
+
+from bitcoin_layer2 import Layer2Protocol
+
+# Channel definitions are (channel_id, capacity, participant_a, participant_b, balance_a, base_fee, fee_rate),
+# the tuple Layer2Protocol.load_channels accepts.
+ChannelDefinition = Tuple[str, int, str, str, int, int, int]
+
+CSV_FIELDS = ('channel_id', 'capacity', 'participant_a', 'participant_b', 'balance_a', 'base_fee', 'fee_rate')
+
+# Binary layout (all integers little-endian):
+#   header:   magic "L2CH" | version u16 | reserved u16 | channel count u64
+#   nodes:    node count u32, then per node: name length u16 | utf-8 name
+#   channels: per channel: id length u16 | utf-8 id | node a u32 | node b u32 |
+#             capacity i64 | balance_a i64 | base_fee i64 | fee_rate i64
+# Node names are stored once and referenced by index, so a channel costs 40 bytes plus its id.
+MAGIC = b"L2CH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+COUNT = struct.Struct("<I")
+NAME_LENGTH = struct.Struct("<H")
+CHANNEL = struct.Struct("<IIqqqq")
+
+def _normalize(definition: Sequence) -> ChannelDefinition:
+    channel_id, capacity, participant_a, participant_b, *rest = definition
+    balance_a = rest[0] if rest and rest[0] is not None else capacity
+    base_fee = rest[1] if len(rest) > 1 else 0
+    fee_rate = rest[2] if len(rest) > 2 else 0
+    return channel_id, capacity, participant_a, participant_b, balance_a, base_fee, fee_rate
+
+def read_csv(path: str) -> Iterator[ChannelDefinition]:
+    """Yield definitions from a CSV file with a header row naming CSV_FIELDS
+
+    Only channel_id, capacity, participant_a and participant_b are required;
+    empty or missing balance_a, base_fee and fee_rate take their defaults.
+    """
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = set(CSV_FIELDS[:4]) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path} is missing CSV columns: {', '.join(sorted(missing))}")
+        for row in reader:
+            capacity = int(row['capacity'])
+            balance_a = row.get('balance_a')
+            yield (row['channel_id'], capacity, row['participant_a'], row['participant_b'],
+                   int(balance_a) if balance_a else capacity,
+                   int(row.get('base_fee') or 0), int(row.get('fee_rate') or 0))
+
+def write_csv(path: str, definitions: Iterable[Sequence]) -> int:
+    """Write definitions as CSV; returns the number written"""
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for definition in definitions:
+            writer.writerow(_normalize(definition))
+            count += 1
+    return count
+
+def write_channel_file(path: str, definitions: Iterable[Sequence]) -> int:
+    """Write definitions in the binary format; returns the number written"""
+    nodes = {}
+    records = []
+    for definition in definitions:
+        channel_id, capacity, participant_a, participant_b, balance_a, base_fee, fee_rate = _normalize(definition)
+        a = nodes.setdefault(participant_a, len(nodes))
+        b = nodes.setdefault(participant_b, len(nodes))
+        encoded = channel_id.encode()
+        records.append(NAME_LENGTH.pack(len(encoded)) + encoded +
+                       CHANNEL.pack(a, b, capacity, balance_a, base_fee, fee_rate))
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(records)))
+        f.write(COUNT.pack(len(nodes)))
+        for name in nodes:
+            encoded = name.encode()
+            f.write(NAME_LENGTH.pack(len(encoded)) + encoded)
+        f.write(b"".join(records))
+    return len(records)
+
+def read_channel_file(path: str) -> Iterator[ChannelDefinition]:
+    """Yield definitions from a memory-mapped binary channel file"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size + COUNT.size:
+            raise ValueError(f"{path} is too small to be a channel file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, _, count = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} channel file")
+            offset = HEADER.size
+            (node_count,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            names = []
+            for _ in range(node_count):
+                (length,) = NAME_LENGTH.unpack_from(data, offset)
+                offset += NAME_LENGTH.size
+                names.append(data[offset:offset + length].decode())
+                offset += length
+            unpack_length = NAME_LENGTH.unpack_from
+            unpack_channel = CHANNEL.unpack_from
+            for _ in range(count):
+                (length,) = unpack_length(data, offset)
+                offset += NAME_LENGTH.size
+                channel_id = data[offset:offset + length].decode()
+                offset += length
+                a, b, capacity, balance_a, base_fee, fee_rate = unpack_channel(data, offset)
+                offset += CHANNEL.size
+                yield channel_id, capacity, names[a], names[b], balance_a, base_fee, fee_rate
+
+def load_channel_file(l2: Layer2Protocol, path: str) -> int:
+    """Bulk-load a CSV or binary channel file into l2; returns the number of channels loaded"""
+    with open(path, 'rb') as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    return l2.load_channels(read_channel_file(path) if binary else read_csv(path))
+
+# Example usage and tests
+def run_tests():
+    definitions = [
+        ('chan1', 1000, 'Alice', 'Bob'),
+        ('chan2', 1000, 'Bob', 'Charlie', 400, 1, 100),
+        ('chan3', 500, 'Alice', 'Dave', 250)
+    ]
+    directory = tempfile.mkdtemp(prefix="l2load-")
+    try:
+        # Test 1: CSV and binary files round trip to the same definitions
+        csv_path = os.path.join(directory, 'channels.csv')
+        bin_path = os.path.join(directory, 'channels.bin')
+        assert write_csv(csv_path, definitions) == 3
+        assert write_channel_file(bin_path, definitions) == 3
+        expected = [_normalize(d) for d in definitions]
+        assert list(read_csv(csv_path)) == expected
+        assert list(read_channel_file(bin_path)) == expected
+        print("Test 1 passed: Channel file round trip")
+
+        # Test 2: Bulk loading builds the same network as create_payment_channel
+        loaded = Layer2Protocol()
+        assert load_channel_file(loaded, bin_path) == 3
+        created = Layer2Protocol()
+        for channel_id, capacity, a, b, balance_a, base_fee, fee_rate in expected:
+            created.create_payment_channel(channel_id, capacity, a, b, base_fee=base_fee, fee_rate=fee_rate)
+            created.channels[channel_id].balance_a = balance_a
+            created.channels[channel_id].balance_b = capacity - balance_a
+            created._index_channel(created.channels[channel_id])
+        assert loaded.channels == created.channels
+        assert loaded.routing_table == created.routing_table
+        assert loaded.find_payment_path('Alice', 'Charlie', 300) == ['chan1', 'chan2']
+        print("Test 2 passed: Bulk load matches per-channel creation")
+
+        # Test 3: A bad definition leaves the network unchanged
+        try:
+            loaded.load_channels([('chan4', 100, 'Eve', 'Frank'), ('chan1', 100, 'Eve', 'Bob')])
+            assert False, "duplicate channel accepted"
+        except ValueError:
+            pass
+        assert 'chan4' not in loaded.channels and 'Eve' not in loaded.routing_table
+        print("Test 3 passed: Bulk load is all-or-nothing")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Histogram bucket i holds values whose integer part has bit length i, i.e. [2**(i-1), 2**i - 1]
+BUCKETS = 64
+
+class _Shard:
+    """Counters and histograms written by a single thread"""
+
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        # name -> [count, sum, min, max, bucket counts]
+        self.histograms: Dict[str, list] = {}
+
+class Metrics:
+    """Counters and power-of-two histograms for Layer2Protocol operations
+
+    Every thread records into its own shard, so the recording path takes no
+    lock; snapshot() copies and merges the shards. Latencies are recorded in
+    microseconds. A tracer, if set, receives one (operation, attributes) event
+    per instrumented call.
+
+    Pass an instance as Layer2Protocol(metrics=...); without one the protocol
+    only pays an `is None` check per operation.
+    """
+
+    def __init__(self, tracer: Optional[Callable[[str, Dict], None]] = None):
+        self.tracer = tracer
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self.started = time.time()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def count(self, name: str, n: int = 1) -> None:
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float) -> None:
+        histograms = self._shard().histograms
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = [0, 0, value, value, [0] * BUCKETS]
+        histogram[0] += 1
+        histogram[1] += value
+        if value < histogram[2]:
+            histogram[2] = value
+        if value > histogram[3]:
+            histogram[3] = value
+        histogram[4][min(int(value).bit_length(), BUCKETS - 1)] += 1
+
+    def operation(self, name: str, start: float, ok: bool, **attributes) -> None:
+        """Record one call of operation name that began at perf_counter() value start
+
+        Counts calls and successes or failures, observes the latency and every
+        numeric attribute (e.g. hops) as a histogram, and emits a trace event.
+        """
+        latency_us = (time.perf_counter() - start) * 1_000_000
+        shard = self._shard()
+        counters = shard.counters
+        outcome = f"{name}.success" if ok else f"{name}.failure"
+        counters[outcome] = counters.get(outcome, 0) + 1
+        self.observe(f"{name}.latency_us", latency_us)
+        for key, value in attributes.items():
+            self.observe(f"{name}.{key}", value)
+        if self.tracer is not None:
+            self.tracer(name, dict(attributes, ok=ok, latency_us=latency_us))
+
+    def reset(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+    def snapshot(self) -> Dict:
+        """Merged counters and histogram summaries (count, sum, min, max, mean, p50/p90/p99)
+
+        Percentiles are the upper bound of the bucket they fall in, so they are
+        accurate to within a factor of two.
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters: Dict[str, int] = {}
+        merged: Dict[str, list] = {}
+        for shard in shards:
+            # dict.copy() and list() run without releasing the GIL, so each copy is consistent
+            for name, value in shard.counters.copy().items():
+                counters[name] = counters.get(name, 0) + value
+            for name, histogram in shard.histograms.copy().items():
+                count, total, low, high, buckets = list(histogram)
+                buckets = list(buckets)
+                if name not in merged:
+                    merged[name] = [count, total, low, high, buckets]
+                    continue
+                target = merged[name]
+                target[0] += count
+                target[1] += total
+                target[2] = min(target[2], low)
+                target[3] = max(target[3], high)
+                target[4] = [a + b for a, b in zip(target[4], buckets)]
+
+        histograms = {}
+        for name, (count, total, low, high, buckets) in sorted(merged.items()):
+            histograms[name] = {
+                'count': count,
+                'sum': total,
+                'min': low,
+                'max': high,
+                'mean': total / count if count else 0.0,
+                'p50': self._percentile(buckets, count, 0.50, high),
+                'p90': self._percentile(buckets, count, 0.90, high),
+                'p99': self._percentile(buckets, count, 0.99, high),
+                'buckets': {2 ** i - 1: n for i, n in enumerate(buckets) if n}
+            }
+        return {
+            'uptime': time.time() - self.started,
+            'counters': dict(sorted(counters.items())),
+            'histograms': histograms
+        }
+
+    @staticmethod
+    def _percentile(buckets: List[int], count: int, fraction: float, high: float) -> float:
+        rank = fraction * count
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(2 ** i - 1, high)
+        return high
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "layer2") -> str:
+        """Render the snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        metric = lambda name: f"{prefix}_{name}".replace('.', '_')
+        lines = []
+        for name, value in snapshot['counters'].items():
+            lines.append(f"# TYPE {metric(name)} counter")
+            lines.append(f"{metric(name)}_total {value}")
+        for name, summary in snapshot['histograms'].items():
+            lines.append(f"# TYPE {metric(name)} histogram")
+            cumulative = 0
+            for upper, n in summary['buckets'].items():
+                cumulative += n
+                lines.append(f'{metric(name)}_bucket{{le="{upper}"}} {cumulative}')
+            lines.append(f'{metric(name)}_bucket{{le="+Inf"}} {summary["count"]}')
+            lines.append(f"{metric(name)}_sum {summary['sum']}")
+            lines.append(f"{metric(name)}_count {summary['count']}")
+        return "\n".join(lines) + "\n"
+
+# Example usage and tests
+def run_tests():
+    from bitcoin_layer2 import Layer2Protocol
+
+    # Test 1: Histograms and counters merge across threads
+    metrics = Metrics()
+    def record(offset):
+        for i in range(1000):
+            metrics.observe('value', offset + i)
+            metrics.count('calls')
+    threads = [threading.Thread(target=record, args=(k * 1000,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['calls'] == 4000
+    value = snapshot['histograms']['value']
+    assert value['count'] == 4000 and value['min'] == 0 and value['max'] == 3999
+    assert 1000 <= value['p50'] <= 4095
+    print("Test 1 passed: Sharded counters and histograms")
+
+    # Test 2: Protocol operations are instrumented and traced
+    events = []
+    metrics = Metrics(tracer=lambda name, attributes: events.append(name))
+    l2 = Layer2Protocol(metrics=metrics)
+    l2.create_payment_channel('chan1', 1000, 'Alice', 'Bob')
+    l2.create_payment_channel('chan2', 1000, 'Bob', 'Charlie')
+    path = l2.find_payment_path('Alice', 'Charlie', 100)
+    assert l2.execute_multi_hop_payment(path, 100, source='Alice')
+    assert not l2.execute_multi_hop_payment(path, 5000, source='Alice')
+    assert l2.find_payment_path('Alice', 'Charlie', 5000) is None
+    l2.update_channel_state('chan1', 800, 200)
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    assert counters['find_payment_path.success'] == 1 and counters['find_payment_path.failure'] == 1
+    assert counters['execute_multi_hop_payment.rollbacks'] == 1
+    assert snapshot['histograms']['execute_multi_hop_payment.hops']['max'] == 2
+    assert snapshot['histograms']['find_payment_path.nodes_expanded']['count'] == 2
+    assert events.count('update_channel_state') == 1
+    assert 'layer2_find_payment_path_latency_us_count 2' in metrics.to_prometheus()
+    print("Test 2 passed: Protocol instrumentation")
+
+if __name__ == "__main__":
+    run_tests()
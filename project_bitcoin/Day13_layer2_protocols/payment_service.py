@@ -0,0 +1,265 @@
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from bitcoin_layer2 import Layer2Protocol
+
+@dataclass
+class PaymentResult:
+    source: str
+    destination: str
+    amount: int
+    success: bool
+    path: Optional[List[str]]
+    # Seconds from submit_payment to completion, and the part of it spent waiting in the queue
+    latency: float
+    queued: float
+
+class PaymentService:
+    """Asyncio front end that feeds a Layer2Protocol in micro-batches.
+
+    submit_payment() enqueues on a bounded queue, so producers are slowed down
+    (backpressure) instead of letting the backlog grow without limit. Worker
+    tasks drain up to batch_size payments, waiting at most batch_delay for a
+    batch to fill, and hand each batch to a thread in one call: route lookups
+    for the same pair and amount bucket are shared within the batch, the
+    payments are committed back to back, and a write-ahead log is waited on
+    once per batch. Channel locks in Layer2Protocol keep concurrent workers
+    consistent.
+    """
+
+    def __init__(
+        self,
+        l2: Layer2Protocol,
+        max_queue: int = 1024,
+        batch_size: int = 64,
+        batch_delay: float = 0.002,
+        workers: int = 1,
+        latency_window: int = 10_000
+    ):
+        self.l2 = l2
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._latencies = deque(maxlen=latency_window)
+        self.submitted = 0
+        self.completed = 0
+        self.succeeded = 0
+        self.batches = 0
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Finish every queued payment, then stop the workers"""
+        if not self._tasks:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self) -> "PaymentService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def submit_payment(self, source: str, destination: str, amount: int) -> PaymentResult:
+        """Route and execute one payment; waits while the queue is full"""
+        if not self._tasks:
+            raise RuntimeError("PaymentService is not running")
+        future = asyncio.get_running_loop().create_future()
+        submitted_at = time.perf_counter()
+        await self._queue.put((source, destination, amount, submitted_at, future))
+        self.submitted += 1
+        return await future
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            started_at = time.perf_counter()
+            try:
+                outcomes = await loop.run_in_executor(
+                    None, self._process_batch, [item[:3] for item in batch])
+            except Exception as exc:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                finished_at = time.perf_counter()
+                self.batches += 1
+                for (source, destination, amount, submitted_at, future), (success, path) in zip(batch, outcomes):
+                    result = PaymentResult(source, destination, amount, success, path,
+                                           finished_at - submitted_at, started_at - submitted_at)
+                    self._latencies.append(result.latency)
+                    self.completed += 1
+                    self.succeeded += success
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _process_batch(self, payments: List[Tuple[str, str, int]]) -> List[Tuple[bool, Optional[List[str]]]]:
+        """Route and commit a batch in submission order (runs in a worker thread)
+
+        Routes are shared by (source, destination, amount bucket), as in
+        RouteCache; a shared route that cannot carry a payment is looked up
+        again for its exact amount. Results are only returned once the whole
+        batch is durable.
+        """
+        routes: Dict[Tuple[str, str, int], List[str]] = {}
+        # Smallest amount per key that found no route since the last success; larger amounts would not find one either
+        unroutable: Dict[Tuple[str, str, int], int] = {}
+        outcomes = []
+        with self.l2.deferred_sync():
+            for source, destination, amount in payments:
+                key = (source, destination, amount.bit_length())
+                path = routes.get(key)
+                if path is None and amount >= unroutable.get(key, math.inf):
+                    outcomes.append((False, None))
+                    continue
+                if path is None:
+                    path = self.l2.find_payment_path(source, destination, amount)
+                success = bool(path) and self.l2.execute_multi_hop_payment(path, amount, source)
+                if path and not success:
+                    # An earlier payment drained the shared route, or it was found for a smaller amount
+                    path = self.l2.find_payment_path(source, destination, amount)
+                    success = bool(path) and self.l2.execute_multi_hop_payment(path, amount, source)
+                if success:
+                    routes[key] = path
+                    # Moved liquidity can open routes that were missing
+                    unroutable.clear()
+                elif path is None:
+                    routes.pop(key, None)
+                    unroutable[key] = min(amount, unroutable.get(key, amount))
+                outcomes.append((success, path if success else None))
+        return outcomes
+
+    def stats(self) -> Dict[str, float]:
+        """Throughput counters and latency percentiles (ms) over the recent window"""
+        latencies = sorted(self._latencies)
+        percentile = lambda f: latencies[min(len(latencies) - 1, int(f * len(latencies)))] * 1000 if latencies else 0.0
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'succeeded': self.succeeded,
+            'batches': self.batches,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'p50_ms': percentile(0.50),
+            'p90_ms': percentile(0.90),
+            'p99_ms': percentile(0.99),
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0
+        }
+
+async def _demo():
+    l2 = Layer2Protocol(route_cache_size=1024)
+    l2.create_payment_channel('chan1', 100_000, 'Alice', 'Bob')
+    l2.create_payment_channel('chan2', 100_000, 'Bob', 'Charlie')
+    l2.create_payment_channel('chan3', 100_000, 'Alice', 'Dave')
+    l2.create_payment_channel('chan4', 100_000, 'Dave', 'Charlie')
+
+    async with PaymentService(l2, max_queue=64, batch_size=32) as service:
+        results = await asyncio.gather(*(
+            service.submit_payment('Alice', 'Charlie', 10 + i % 50) for i in range(500)))
+        print(f"{sum(r.success for r in results)} of {len(results)} payments succeeded")
+        print(service.stats())
+
+    print(l2.get_channel_state('chan1'))
+    print(l2.get_channel_state('chan3'))
+
+def main():
+    asyncio.run(_demo())
+
+# Tests
+async def _run_tests():
+    import shutil
+    import tempfile
+    import threading
+    from channel_wal import WriteAheadLog
+    from layer2_metrics import Metrics
+
+    def network(**kwargs) -> Layer2Protocol:
+        l2 = Layer2Protocol(**kwargs)
+        l2.create_payment_channel('chan1', 100_000, 'Alice', 'Bob')
+        l2.create_payment_channel('chan2', 100_000, 'Bob', 'Charlie')
+        return l2
+
+    # Test 1: A full queue holds producers back until the workers catch up
+    service = PaymentService(network(), max_queue=4, batch_size=2)
+    release = threading.Event()
+    process_batch = service._process_batch
+    def blocked_batch(payments):
+        release.wait()
+        return process_batch(payments)
+    service._process_batch = blocked_batch
+    async with service:
+        pending = [asyncio.ensure_future(service.submit_payment('Alice', 'Charlie', 10)) for _ in range(20)]
+        await asyncio.sleep(0.05)
+        assert service.stats()['queue_depth'] == 4 and service.submitted <= 4 + 2
+        release.set()
+        results = await asyncio.gather(*pending)
+    assert all(result.success for result in results) and service.completed == 20
+    print("Test 1 passed: Backpressure")
+
+    # Test 2: Route lookups and durability waits are shared across a batch
+    directory = tempfile.mkdtemp(prefix="l2service-")
+    try:
+        with WriteAheadLog(directory) as wal:
+            metrics = Metrics()
+            l2 = network(wal=wal, metrics=metrics)
+            fsyncs = wal.stats()['fsyncs']
+            async with PaymentService(l2, max_queue=64, batch_size=64) as service:
+                results = await asyncio.gather(*(
+                    service.submit_payment('Alice', 'Charlie', 100 + i % 28) for i in range(500)))
+            assert all(result.success for result in results)
+            assert wal.stats()['fsyncs'] - fsyncs <= service.batches
+            lookups = metrics.snapshot()['counters']['find_payment_path.success']
+            assert lookups <= service.batches
+            assert l2.channels['chan2'].balance_b == sum(result.amount for result in results)
+    finally:
+        shutil.rmtree(directory)
+    print("Test 2 passed: Batched routing and durability")
+
+    # Test 3: An error while processing a batch reaches every submitter in it
+    l2 = network()
+    def fail(*args):
+        raise RuntimeError("routing failed")
+    l2.find_payment_path = fail
+    async with PaymentService(l2, batch_size=8, batch_delay=0.05) as service:
+        outcomes = await asyncio.gather(*(service.submit_payment('Alice', 'Charlie', 10) for _ in range(4)),
+                                        return_exceptions=True)
+        assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+        del l2.find_payment_path
+        assert (await service.submit_payment('Alice', 'Charlie', 10)).success
+    print("Test 3 passed: Exceptions propagate to submitters")
+
+def run_tests():
+    asyncio.run(_run_tests())
+
+if __name__ == '__main__':
+    main()
+    run_tests()
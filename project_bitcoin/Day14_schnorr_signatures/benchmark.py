@@ -0,0 +1,133 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from schnorr import SchnorrSignature
+
+DEFAULT_BATCH_SIZES = (8, 64, 256)
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure(fn: Callable[[int], object], iterations: int, items_per_call: int = 1,
+            warmup: int = 3) -> Dict[str, float]:
+    """Time fn(i) for i in range(iterations) and summarize throughput and latency.
+
+    ops_per_sec counts items (e.g. signatures in a batch), latencies are per call.
+    """
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'items_per_call': items_per_call,
+        'ops_per_sec': iterations * items_per_call / total if total else float('inf'),
+        'mean_ms': total / iterations * 1000,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p90_ms': _percentile(latencies, 0.90) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000
+    }
+
+def run_benchmarks(iterations: int = 50, batch_sizes=DEFAULT_BATCH_SIZES) -> Dict[str, Dict[str, float]]:
+    """Benchmark the SchnorrSignature primitives; returns results keyed by benchmark name."""
+    schnorr = SchnorrSignature()
+    # Build the shared generator tables up front so they are not charged to the first sample
+    SchnorrSignature._generator_table()
+    SchnorrSignature._generator_wnaf_table()
+
+    keypairs = schnorr.generate_keypairs(max(iterations, 1))
+    scalars = [sk for sk, _ in keypairs]
+    points = [pk for _, pk in keypairs]
+    private_key, public_key = keypairs[0]
+    messages = [f"benchmark message {i}".encode() for i in range(max(iterations, max(batch_sizes, default=1)))]
+    signatures = schnorr.sign_many(private_key, messages)
+    pick = lambda seq, i: seq[i % len(seq)]
+
+    results = {
+        'point_add': measure(lambda i: schnorr.point_add(pick(points, i), pick(points, i + 1)), iterations),
+        'point_mul_fixed_base': measure(lambda i: schnorr.point_mul(pick(scalars, i), schnorr.G), iterations),
+        'point_mul_variable_base': measure(
+            lambda i: schnorr.point_mul(pick(scalars, i + 1), pick(points, i)), iterations),
+        'generate_keypair': measure(lambda i: schnorr.generate_keypair(), iterations),
+        'sign': measure(lambda i: schnorr.sign(private_key, pick(messages, i)), iterations),
+        'verify': measure(
+            lambda i: schnorr.verify(public_key, pick(messages, i), pick(signatures, i)), iterations),
+    }
+
+    # Batches mix distinct keys so the benchmark does not benefit from per-key term merging
+    for size in batch_sizes:
+        batch_keys = schnorr.generate_keypairs(size)
+        batch = [(pk, messages[j], schnorr.sign(sk, messages[j])) for j, (sk, pk) in enumerate(batch_keys)]
+        calls = max(1, iterations // size)
+        results[f'verify_batch_{size}'] = measure(lambda i: schnorr.verify_batch(batch), calls,
+                                                  items_per_call=size, warmup=1)
+    return results
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                        tolerance: float) -> List[str]:
+    """Return a description of every benchmark whose throughput fell more than tolerance below baseline."""
+    regressions = []
+    for name, stats in baseline.items():
+        if name not in results:
+            continue
+        allowed = stats['ops_per_sec'] * (1 - tolerance)
+        current = results[name]['ops_per_sec']
+        if current < allowed:
+            regressions.append(f"{name}: {current:.1f} ops/s < {allowed:.1f} ops/s "
+                               f"(baseline {stats['ops_per_sec']:.1f}, tolerance {tolerance:.0%})")
+    return regressions
+
+def print_report(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'benchmark':<28}{'ops/s':>12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<28}{stats['ops_per_sec']:>12.1f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p90_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark schnorr.py primitives")
+    parser.add_argument('--iterations', type=int, default=50, help="calls per benchmark")
+    parser.add_argument('--batch-sizes', type=int, nargs='*', default=list(DEFAULT_BATCH_SIZES),
+                        help="batch sizes for verify_batch")
+    parser.add_argument('--output', help="write results as JSON to this path")
+    parser.add_argument('--baseline', help="JSON results to compare against; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed fractional throughput drop versus the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.iterations, args.batch_sizes)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'timestamp': int(time.time()),
+                'results': results
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,63 @@
 import hashlib
+import os
 import random
-from typing import Tuple, Optional
+import secrets
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+class PythonFieldBackend:
+    """Field arithmetic on plain CPython ints; always available."""
+
+    name = 'python'
+
+    def element(self, x: int) -> int:
+        return x
+
+    def to_int(self, x) -> int:
+        return x
+
+    def inverse(self, a, m: int):
+        return pow(a, m - 2, m)
+
+    def pow(self, a, e: int, m: int):
+        return pow(a, e, m)
+
+class Gmpy2FieldBackend:
+    """Field arithmetic on gmpy2 mpz values (GMP multiplication, reduction and inversion)."""
+
+    name = 'gmpy2'
+
+    def __init__(self):
+        if gmpy2 is None:
+            raise ImportError("gmpy2 is not installed")
+        self._mpz = gmpy2.mpz
+
+    def element(self, x: int):
+        return self._mpz(x)
+
+    def to_int(self, x) -> int:
+        return int(x)
+
+    def inverse(self, a, m: int):
+        return gmpy2.invert(a, m)
+
+    def pow(self, a, e: int, m: int):
+        return gmpy2.powmod(a, e, m)
+
+FIELD_BACKENDS = {
+    'python': PythonFieldBackend,
+    'gmpy2': Gmpy2FieldBackend
+}
+
+def available_backends() -> List[str]:
+    """Names of the field backends that can be used in this environment."""
+    return [name for name in FIELD_BACKENDS if name != 'gmpy2' or gmpy2 is not None]
 
 class SchnorrSignature:
     # Curve parameters - using secp256k1 parameters
@@ -9,44 +66,524 @@ class SchnorrSignature:
     G_x = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
     G_y = 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
 
+    # GLV endomorphism: phi(x, y) = (BETA*x, y) equals LAMBDA*(x, y) on secp256k1.
+    # (GLV_A1, GLV_B1) and (GLV_A2, GLV_B2) span the lattice used to split scalars.
+    BETA = 0x7AE96A2B657C07106E64479EAC3434E99CF0497512F58995C1396C28719501EE
+    LAMBDA = 0x5363AD4CC05C30E0A5261C028812645A122E22EA20816678DF02967C1B23BD72
+    GLV_A1 = 0x3086D221A7D46BCDE86C90E49284EB15
+    GLV_B1 = -0xE4437ED6010E88286F547FA90ABFE4C3
+    GLV_A2 = 0x114CA50F7A8E2F3F657C1108D9D44CFD8
+    GLV_B2 = 0x3086D221A7D46BCDE86C90E49284EB15
+    USE_GLV = True
+
+    # Field arithmetic backend; see set_backend(). _field_p and _field_beta are P and BETA as backend elements.
+    backend = PythonFieldBackend()
+    _field_p = P
+    _field_beta = BETA
+
+    # Fixed-base table for G: row i holds j * 2^(W*i) * G for j = 1..2^W - 1.
+    # Built lazily on first use and shared by every instance in the process.
+    G_TABLE_WINDOW = 4
+    _g_table = None
+
+    # Multi-scalar multiplication tuning: Strauss below the threshold, Pippenger above it
+    STRAUSS_WINDOW = 5
+    PIPPENGER_THRESHOLD = 64
+
+    # Wider wNAF window for G in double-scalar multiplication; its table is cached like _g_table
+    G_WNAF_WINDOW = 8
+    _g_wnaf_table = None
+
+    # Bit length of the random coefficients used in batch verification
+    BATCH_COEFFICIENT_BITS = 128
+
+    # SHA-256 states already fed with sha256(tag) || sha256(tag), keyed by tag
+    _tag_midstates = {}
+
+    # MuSig key aggregation results (aggregate key, per-key coefficients), keyed by sorted key set
+    MUSIG_CACHE_SIZE = 1024
+    _musig_cache = OrderedDict()
+
+    @classmethod
+    def set_backend(cls, name: str) -> None:
+        """Select the field arithmetic backend ('python' or 'gmpy2') for all instances.
+
+        Public results are always plain ints, so backends are interchangeable.
+        """
+        if name not in FIELD_BACKENDS:
+            raise ValueError(f"Unknown field backend {name}")
+        backend = FIELD_BACKENDS[name]()
+        SchnorrSignature.backend = backend
+        SchnorrSignature._field_p = backend.element(cls.P)
+        SchnorrSignature._field_beta = backend.element(cls.BETA)
+        # Cached Jacobian tables hold elements of the previous backend
+        SchnorrSignature._g_wnaf_table = None
+
+    @staticmethod
+    def _to_jacobian(point: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int, int]]:
+        """Lift an affine point to Jacobian coordinates (X, Y, Z) with x = X/Z^2, y = Y/Z^3."""
+        if point is None:
+            return None
+        field = SchnorrSignature.backend
+        return (field.element(point[0]), field.element(point[1]), field.element(1))
+
     @staticmethod
-    def point_add(P1: Optional[Tuple[int, int]], P2: Tuple[int, int]) -> Tuple[int, int]:
+    def _from_jacobian(point: Optional[Tuple[int, int, int]]) -> Optional[Tuple[int, int]]:
+        """Convert a Jacobian point back to affine coordinates (one inversion)."""
+        if point is None:
+            return None
+        p = SchnorrSignature._field_p
+        field = SchnorrSignature.backend
+        X, Y, Z = point
+        z_inv = field.inverse(Z, p)
+        z_inv2 = z_inv * z_inv % p
+        return (field.to_int(X * z_inv2 % p), field.to_int(Y * z_inv2 * z_inv % p))
+
+    @staticmethod
+    def _jacobian_double(point: Optional[Tuple[int, int, int]]) -> Optional[Tuple[int, int, int]]:
+        """Double a Jacobian point (secp256k1 has a = 0, so no Z^4 term)."""
+        if point is None:
+            return None
+        p = SchnorrSignature._field_p
+        X, Y, Z = point
+        if Y == 0:
+            return None
+        A = X * X % p
+        B = Y * Y % p
+        C = B * B % p
+        D = 2 * ((X + B) * (X + B) - A - C) % p
+        E = 3 * A % p
+        X3 = (E * E - 2 * D) % p
+        Y3 = (E * (D - X3) - 8 * C) % p
+        Z3 = 2 * Y * Z % p
+        return (X3, Y3, Z3)
+
+    @staticmethod
+    def _jacobian_add(P1: Optional[Tuple[int, int, int]],
+                      P2: Optional[Tuple[int, int, int]]) -> Optional[Tuple[int, int, int]]:
+        """Add two Jacobian points without any modular inversion."""
         if P1 is None:
             return P2
         if P2 is None:
             return P1
-        
-        x1, y1 = P1
+        p = SchnorrSignature._field_p
+        X1, Y1, Z1 = P1
+        X2, Y2, Z2 = P2
+        Z1Z1 = Z1 * Z1 % p
+        Z2Z2 = Z2 * Z2 % p
+        U1 = X1 * Z2Z2 % p
+        U2 = X2 * Z1Z1 % p
+        S1 = Y1 * Z2 * Z2Z2 % p
+        S2 = Y2 * Z1 * Z1Z1 % p
+        if U1 == U2:
+            if S1 != S2:
+                return None
+            return SchnorrSignature._jacobian_double(P1)
+        H = (U2 - U1) % p
+        R = (S2 - S1) % p
+        H2 = H * H % p
+        H3 = H * H2 % p
+        U1H2 = U1 * H2 % p
+        X3 = (R * R - H3 - 2 * U1H2) % p
+        Y3 = (R * (U1H2 - X3) - S1 * H3) % p
+        Z3 = H * Z1 * Z2 % p
+        return (X3, Y3, Z3)
+
+    @staticmethod
+    def _jacobian_add_affine(P1: Optional[Tuple[int, int, int]],
+                             P2: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int, int]]:
+        """Mixed addition of a Jacobian point and an affine point (Z2 = 1)."""
+        if P2 is None:
+            return P1
+        if P1 is None:
+            return (P2[0], P2[1], 1)
+        p = SchnorrSignature._field_p
+        X1, Y1, Z1 = P1
         x2, y2 = P2
-        
-        if x1 == x2 and y1 == y2:
-            # Point doubling
-            lam = (3 * x1 * x1) * pow(2 * y1, SchnorrSignature.P - 2, SchnorrSignature.P)
-        else:
-            # Point addition
-            lam = ((y2 - y1) * pow(x2 - x1, SchnorrSignature.P - 2, SchnorrSignature.P))
-        
-        lam = lam % SchnorrSignature.P
-        x3 = (lam * lam - x1 - x2) % SchnorrSignature.P
-        y3 = (lam * (x1 - x3) - y1) % SchnorrSignature.P
-        
-        return (x3, y3)
+        Z1Z1 = Z1 * Z1 % p
+        U2 = x2 * Z1Z1 % p
+        S2 = y2 * Z1 * Z1Z1 % p
+        if X1 == U2:
+            if Y1 != S2:
+                return None
+            return SchnorrSignature._jacobian_double(P1)
+        H = (U2 - X1) % p
+        R = (S2 - Y1) % p
+        H2 = H * H % p
+        H3 = H * H2 % p
+        U1H2 = X1 * H2 % p
+        X3 = (R * R - H3 - 2 * U1H2) % p
+        Y3 = (R * (U1H2 - X3) - Y1 * H3) % p
+        Z3 = H * Z1 % p
+        return (X3, Y3, Z3)
+
+    @staticmethod
+    def point_add(P1: Optional[Tuple[int, int]], P2: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        if P1 is None:
+            return P2
+        if P2 is None:
+            return P1
+
+        # One inversion for the final affine result, none for the addition itself
+        return SchnorrSignature._from_jacobian(
+            SchnorrSignature._jacobian_add_affine(SchnorrSignature._to_jacobian(P1), P2))
+
+    @staticmethod
+    def _batch_inverse(values: List[int]) -> List[int]:
+        """Invert many non-zero field elements with one exponentiation (Montgomery's trick)."""
+        p = SchnorrSignature._field_p
+        prefix = []
+        acc = 1
+        for v in values:
+            prefix.append(acc)
+            acc = acc * v % p
+        inv = SchnorrSignature.backend.inverse(acc, p)
+        out = [0] * len(values)
+        for i in range(len(values) - 1, -1, -1):
+            out[i] = prefix[i] * inv % p
+            inv = inv * values[i] % p
+        return out
+
+    @staticmethod
+    def _batch_to_affine(points: List[Optional[Tuple[int, int, int]]]) -> List[Optional[Tuple[int, int]]]:
+        """Normalize many Jacobian points to affine with a single shared inversion."""
+        p = SchnorrSignature._field_p
+        to_int = SchnorrSignature.backend.to_int
+        finite = [point for point in points if point is not None]
+        inverses = iter(SchnorrSignature._batch_inverse([Z for _, _, Z in finite]))
+        out = []
+        for point in points:
+            if point is None:
+                out.append(None)
+                continue
+            X, Y, _ = point
+            z_inv = next(inverses)
+            z_inv2 = z_inv * z_inv % p
+            out.append((to_int(X * z_inv2 % p), to_int(Y * z_inv2 * z_inv % p)))
+        return out
+
+    @staticmethod
+    def _build_fixed_base_table(point: Tuple[int, int], w: int) -> List[List[Tuple[int, int]]]:
+        """Affine table where row i holds j * 2^(w*i) * point for j = 1..2^w - 1."""
+        rows = (SchnorrSignature.N.bit_length() + w - 1) // w
+        width = (1 << w) - 1
+        jacobian = []
+        base = SchnorrSignature._to_jacobian(point)
+        for _ in range(rows):
+            acc = None
+            for _ in range(width):
+                acc = SchnorrSignature._jacobian_add(acc, base)
+                jacobian.append(acc)
+            for _ in range(w):
+                base = SchnorrSignature._jacobian_double(base)
+        affine = SchnorrSignature._batch_to_affine(jacobian)
+        return [affine[i:i + width] for i in range(0, len(affine), width)]
+
+    @staticmethod
+    def _fixed_base_accumulate(acc: Optional[Tuple[int, int, int]], k: int,
+                               table: List[List[Tuple[int, int]]], w: int) -> Optional[Tuple[int, int, int]]:
+        """Add k*point into a Jacobian accumulator using a fixed-base table (no doublings)."""
+        add_affine = SchnorrSignature._jacobian_add_affine
+        mask = (1 << w) - 1
+        k %= SchnorrSignature.N
+        for row in table:
+            if not k:
+                break
+            digit = k & mask
+            if digit:
+                acc = add_affine(acc, row[digit - 1])
+            k >>= w
+        return acc
+
+    @classmethod
+    def _generator_table(cls) -> List[List[Tuple[int, int]]]:
+        """Return the fixed-base table for G, building it on first use."""
+        if cls._g_table is None:
+            SchnorrSignature._g_table = cls._build_fixed_base_table((cls.G_x, cls.G_y), cls.G_TABLE_WINDOW)
+        return cls._g_table
+
+    @staticmethod
+    def point_mul_base(k: int) -> Optional[Tuple[int, int]]:
+        """Compute k*G from the precomputed table: one mixed addition per non-zero window."""
+        return SchnorrSignature._from_jacobian(SchnorrSignature._fixed_base_accumulate(
+            None, k, SchnorrSignature._generator_table(), SchnorrSignature.G_TABLE_WINDOW))
 
     @staticmethod
     def point_mul(k: int, P: Tuple[int, int]) -> Tuple[int, int]:
+        if P == (SchnorrSignature.G_x, SchnorrSignature.G_y):
+            return SchnorrSignature.point_mul_base(k)
+        if SchnorrSignature.USE_GLV:
+            return SchnorrSignature.point_mul_glv(k, P)
+
         result = None
-        addend = P
+        addend = SchnorrSignature._to_jacobian(P)
 
+        # Double-and-add entirely in Jacobian coordinates; convert back once at the end
         while k:
             if k & 1:
-                result = SchnorrSignature.point_add(result, addend)
-            addend = SchnorrSignature.point_add(addend, addend)
+                result = SchnorrSignature._jacobian_add(result, addend)
+            addend = SchnorrSignature._jacobian_double(addend)
             k >>= 1
 
+        return SchnorrSignature._from_jacobian(result)
+
+    @staticmethod
+    def is_on_curve(point: Optional[Tuple[int, int]]) -> bool:
+        """Check that an affine point satisfies y^2 = x^3 + 7 over the field."""
+        if point is None:
+            return False
+        p = SchnorrSignature._field_p
+        x, y = point
+        return 0 <= x < p and 0 <= y < p and (y * y - x * x * x - 7) % p == 0
+
+    @staticmethod
+    def _wnaf(k: int, w: int) -> List[int]:
+        """Width-w non-adjacent form of k, least significant digit first."""
+        digits = []
+        full = 1 << w
+        half = full >> 1
+        while k:
+            if k & 1:
+                d = k & (full - 1)
+                if d >= half:
+                    d -= full
+                k -= d
+            else:
+                d = 0
+            digits.append(d)
+            k >>= 1
+        return digits
+
+    @staticmethod
+    def _odd_multiples(point: Tuple[int, int], w: int) -> List[Tuple[int, int, int]]:
+        """Jacobian table [P, 3P, 5P, ...] with 2^(w-2) entries for wNAF digits."""
+        base = SchnorrSignature._to_jacobian(point)
+        twice = SchnorrSignature._jacobian_double(base)
+        table = [base]
+        for _ in range((1 << (w - 2)) - 1):
+            table.append(SchnorrSignature._jacobian_add(table[-1], twice))
+        return table
+
+    @staticmethod
+    def _strauss(terms: List[Tuple[List[int], List[Tuple[int, int, int]]]]) -> Optional[Tuple[int, int, int]]:
+        """Interleaved wNAF evaluation: one shared doubling chain for every term."""
+        p = SchnorrSignature._field_p
+        add = SchnorrSignature._jacobian_add
+        double = SchnorrSignature._jacobian_double
+        length = max((len(naf) for naf, _ in terms), default=0)
+        # Bucket the non-zero digits by position so the main loop never scans zeros
+        additions = [[] for _ in range(length)]
+        for naf, table in terms:
+            for i, d in enumerate(naf):
+                if d > 0:
+                    additions[i].append(table[d >> 1])
+                elif d < 0:
+                    X, Y, Z = table[(-d) >> 1]
+                    additions[i].append((X, p - Y, Z))
+        result = None
+        for i in range(length - 1, -1, -1):
+            result = double(result)
+            for point in additions[i]:
+                result = add(result, point)
         return result
 
-    def __init__(self):
+    @staticmethod
+    def _pippenger(terms: List[Tuple[int, Tuple[int, int]]]) -> Optional[Tuple[int, int, int]]:
+        """Bucket method: per c-bit window, sort points into buckets and sum them by running sums."""
+        add = SchnorrSignature._jacobian_add
+        add_affine = SchnorrSignature._jacobian_add_affine
+        double = SchnorrSignature._jacobian_double
+        c = max(2, len(terms).bit_length() - 2)
+        mask = (1 << c) - 1
+        bits = max(k.bit_length() for k, _ in terms)
+        result = None
+        for window in range((bits + c - 1) // c - 1, -1, -1):
+            for _ in range(c):
+                result = double(result)
+            shift = window * c
+            buckets = [None] * mask
+            for k, point in terms:
+                d = (k >> shift) & mask
+                if d:
+                    buckets[d - 1] = add_affine(buckets[d - 1], point)
+            running = None
+            window_sum = None
+            for bucket in reversed(buckets):
+                running = add(running, bucket)
+                window_sum = add(window_sum, running)
+            result = add(result, window_sum)
+        return result
+
+    @staticmethod
+    def glv_split(k: int) -> Tuple[int, int]:
+        """Split k into (k1, k2) with k = k1 + k2*LAMBDA (mod N) and |k1|, |k2| around 128 bits."""
+        S = SchnorrSignature
+        n = S.N
+        k %= n
+        c1 = (S.GLV_B2 * k + n // 2) // n
+        c2 = (-S.GLV_B1 * k + n // 2) // n
+        k1 = k - c1 * S.GLV_A1 - c2 * S.GLV_A2
+        k2 = -c1 * S.GLV_B1 - c2 * S.GLV_B2
+        return k1, k2
+
+    @staticmethod
+    def _phi_table(table: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """Apply the endomorphism to a Jacobian table; phi only scales X, so no additions are needed."""
+        p = SchnorrSignature._field_p
+        beta = SchnorrSignature._field_beta
+        return [(X * beta % p, Y, Z) for X, Y, Z in table]
+
+    @staticmethod
+    def _glv_terms(k: int, table: List[Tuple[int, int, int]], w: int,
+                   phi_table: Optional[List[Tuple[int, int, int]]] = None) -> List[Tuple[List[int], List[Tuple[int, int, int]]]]:
+        """Strauss terms for k*P from P's odd-multiples table: k1*P + k2*phi(P)."""
+        k1, k2 = SchnorrSignature.glv_split(k)
+        if phi_table is None:
+            phi_table = SchnorrSignature._phi_table(table)
+        terms = []
+        for part, part_table in ((k1, table), (k2, phi_table)):
+            if part:
+                naf = SchnorrSignature._wnaf(abs(part), w)
+                if part < 0:
+                    naf = [-d for d in naf]
+                terms.append((naf, part_table))
+        return terms
+
+    @staticmethod
+    def point_mul_glv(k: int, P: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Variable-base k*P using the GLV endomorphism: ~128 doublings instead of ~256."""
+        if P is None or not k % SchnorrSignature.N:
+            return None
+        w = SchnorrSignature.STRAUSS_WINDOW
+        terms = SchnorrSignature._glv_terms(k, SchnorrSignature._odd_multiples(P, w), w)
+        return SchnorrSignature._from_jacobian(SchnorrSignature._strauss(terms))
+
+    @classmethod
+    def _generator_wnaf_table(cls) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int, int]]]:
+        """Return the cached odd-multiples tables of G and phi(G) used by double_scalar_mul."""
+        if cls._g_wnaf_table is None:
+            table = cls._odd_multiples((cls.G_x, cls.G_y), cls.G_WNAF_WINDOW)
+            SchnorrSignature._g_wnaf_table = (table, cls._phi_table(table))
+        return cls._g_wnaf_table
+
+    @staticmethod
+    def double_scalar_mul(a: int, A: Tuple[int, int], b: int, B: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Compute a*A + b*B with one shared doubling chain (Shamir's trick with wNAF)."""
+        n = SchnorrSignature.N
+        w = SchnorrSignature.STRAUSS_WINDOW
+        terms = []
+        for k, point in ((a % n, A), (b % n, B)):
+            if not k or point is None:
+                continue
+            if point == (SchnorrSignature.G_x, SchnorrSignature.G_y):
+                k_w = SchnorrSignature.G_WNAF_WINDOW
+                table, phi_table = SchnorrSignature._generator_wnaf_table()
+            else:
+                k_w, table, phi_table = w, SchnorrSignature._odd_multiples(point, w), None
+            if SchnorrSignature.USE_GLV:
+                terms.extend(SchnorrSignature._glv_terms(k, table, k_w, phi_table))
+            else:
+                terms.append((SchnorrSignature._wnaf(k, k_w), table))
+        return SchnorrSignature._from_jacobian(SchnorrSignature._strauss(terms))
+
+    @staticmethod
+    def multi_scalar_mul(terms: List[Tuple[int, Tuple[int, int]]]) -> Optional[Tuple[int, int]]:
+        """Compute sum(k_i * P_i) for (k_i, P_i) pairs with a single final inversion."""
+        n = SchnorrSignature.N
+        terms = [(k % n, point) for k, point in terms if point is not None and k % n]
+        if not terms:
+            return None
+        if len(terms) < SchnorrSignature.PIPPENGER_THRESHOLD:
+            w = SchnorrSignature.STRAUSS_WINDOW
+            strauss_terms = []
+            for k, point in terms:
+                table = SchnorrSignature._odd_multiples(point, w)
+                if SchnorrSignature.USE_GLV:
+                    strauss_terms.extend(SchnorrSignature._glv_terms(k, table, w))
+                else:
+                    strauss_terms.append((SchnorrSignature._wnaf(k, w), table))
+            result = SchnorrSignature._strauss(strauss_terms)
+        else:
+            result = SchnorrSignature._pippenger(terms)
+        return SchnorrSignature._from_jacobian(result)
+
+    @staticmethod
+    def tagged_hash(tag: str, *chunks: bytes) -> bytes:
+        """BIP340 tagged hash sha256(sha256(tag) || sha256(tag) || chunks...).
+
+        The 64-byte tag prefix is hashed once per tag; each call copies that
+        midstate instead of rehashing it.
+        """
+        midstate = SchnorrSignature._tag_midstates.get(tag)
+        if midstate is None:
+            tag_digest = hashlib.sha256(tag.encode()).digest()
+            midstate = hashlib.sha256(tag_digest + tag_digest)
+            SchnorrSignature._tag_midstates[tag] = midstate
+        h = midstate.copy()
+        for chunk in chunks:
+            h.update(chunk)
+        return h.digest()
+
+    @staticmethod
+    def lift_x(x: int) -> Optional[Tuple[int, int]]:
+        """Return the curve point with the given x-coordinate and even y, or None."""
+        if not 0 <= x < SchnorrSignature.P:
+            return None
+        field = SchnorrSignature.backend
+        p = SchnorrSignature._field_p
+        X = field.element(x)
+        c = (X * X * X + 7) % p
+        y = field.pow(c, (SchnorrSignature.P + 1) // 4, p)
+        if y * y % p != c:
+            return None
+        y = field.to_int(y)
+        return (x, y if y & 1 == 0 else SchnorrSignature.P - y)
+
+    @staticmethod
+    def serialize_pubkey(public_key: Tuple[int, int], out: Optional[bytearray] = None,
+                         offset: int = 0) -> Optional[bytes]:
+        """Encode a public key as its 32-byte x-coordinate.
+
+        Returns new bytes, or writes in place into out[offset:offset + 32] when a buffer is given.
+        """
+        encoded = public_key[0].to_bytes(32, 'big')
+        if out is None:
+            return encoded
+        memoryview(out)[offset:offset + 32] = encoded
+        return None
+
+    @staticmethod
+    def parse_pubkey(data, offset: int = 0) -> Optional[Tuple[int, int]]:
+        """Decode a 32-byte x-only public key from any buffer without copying it."""
+        view = memoryview(data)[offset:offset + 32]
+        if len(view) != 32:
+            return None
+        return SchnorrSignature.lift_x(int.from_bytes(view, 'big'))
+
+    @staticmethod
+    def serialize_signature(signature: Tuple[int, int], out: Optional[bytearray] = None,
+                            offset: int = 0) -> Optional[bytes]:
+        """Encode an (r, s) compact signature as 64 bytes, optionally into an existing buffer."""
+        r, s = signature
+        if out is None:
+            return r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+        view = memoryview(out)
+        view[offset:offset + 32] = r.to_bytes(32, 'big')
+        view[offset + 32:offset + 64] = s.to_bytes(32, 'big')
+        return None
+
+    @staticmethod
+    def parse_signature(data, offset: int = 0) -> Optional[Tuple[int, int]]:
+        """Decode a 64-byte compact signature into (r, s) without copying the buffer."""
+        view = memoryview(data)[offset:offset + 64]
+        if len(view) != 64:
+            return None
+        return int.from_bytes(view[:32], 'big'), int.from_bytes(view[32:], 'big')
+
+    def __init__(self, key_cache_size: int = 0):
         self.G = (self.G_x, self.G_y)
+        # Opt-in per-public-key fixed-base tables for keys that are verified repeatedly
+        self.key_cache = PublicKeyTableCache(key_cache_size) if key_cache_size > 0 else None
 
     def generate_keypair(self) -> Tuple[int, Tuple[int, int]]:
         """Generate a private key and corresponding public key."""
@@ -54,11 +591,23 @@ class SchnorrSignature:
         public_key = self.point_mul(private_key, self.G)
         return private_key, public_key
 
+    def generate_keypairs(self, n: int) -> List[Tuple[int, Tuple[int, int]]]:
+        """Generate n keypairs, normalizing all public keys with one shared inversion."""
+        table = self._generator_table()
+        w = self.G_TABLE_WINDOW
+        private_keys = [random.randrange(1, self.N) for _ in range(n)]
+        public_keys = self._batch_to_affine(
+            [self._fixed_base_accumulate(None, k, table, w) for k in private_keys])
+        return list(zip(private_keys, public_keys))
+
     def tag_hash(self, m: bytes, R: Tuple[int, int], P: Tuple[int, int]) -> int:
         """Compute the tagged hash for Schnorr signature."""
-        data = R[0].to_bytes(32, 'big') + R[1].to_bytes(32, 'big') + \
-               P[0].to_bytes(32, 'big') + P[1].to_bytes(32, 'big') + m
-        return int.from_bytes(hashlib.sha256(data).digest(), 'big')
+        h = hashlib.sha256(R[0].to_bytes(32, 'big'))
+        h.update(R[1].to_bytes(32, 'big'))
+        h.update(P[0].to_bytes(32, 'big'))
+        h.update(P[1].to_bytes(32, 'big'))
+        h.update(m)
+        return int.from_bytes(h.digest(), 'big')
 
     def sign(self, private_key: int, message: bytes) -> Tuple[Tuple[int, int], int]:
         """Generate a Schnorr signature for a message."""
@@ -69,17 +618,369 @@ class SchnorrSignature:
         s = (k + e * private_key) % self.N
         return R, s
 
+    def sign_many(self, private_key: int, messages: Iterable[bytes]) -> List[Tuple[Tuple[int, int], int]]:
+        """Sign many messages with one key; all nonce points share a single inversion."""
+        messages = list(messages)
+        table = self._generator_table()
+        w = self.G_TABLE_WINDOW
+        public_key = self.point_mul_base(private_key)
+        nonces = [random.randrange(1, self.N) for _ in messages]
+        nonce_points = self._batch_to_affine(
+            [self._fixed_base_accumulate(None, k, table, w) for k in nonces])
+        signatures = []
+        for message, k, R in zip(messages, nonces, nonce_points):
+            e = self.tag_hash(message, R, public_key)
+            signatures.append((R, (k + e * private_key) % self.N))
+        return signatures
+
     def verify(self, public_key: Tuple[int, int], message: bytes, 
                signature: Tuple[Tuple[int, int], int]) -> bool:
         """Verify a Schnorr signature."""
         R, s = signature
+        if not self._well_formed(public_key, R, s):
+            return False
         e = self.tag_hash(message, R, public_key)
         
-        # sG = R + eP
-        sG = self.point_mul(s, self.G)
-        R_plus_eP = self.point_add(R, self.point_mul(e, public_key))
-        
-        return sG == R_plus_eP
+        # sG = R + eP  <=>  sG - eP = R
+        return self._commitment_point(s, e, public_key) == R
+
+    def _well_formed(self, public_key: Tuple[int, int], R: Tuple[int, int], s: int) -> bool:
+        """True if both points are on the curve and 0 <= s < N; verify and verify_batch both require it."""
+        return self.is_on_curve(public_key) and self.is_on_curve(R) and 0 <= s < self.N
+
+    def _commitment_point(self, s: int, e: int, public_key: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Compute s*G - e*P, the point a valid signature's R must equal."""
+        table = self.key_cache.get(public_key) if self.key_cache is not None else None
+        if table is not None:
+            # Both bases have fixed-base tables, so no doublings are needed at all
+            w = self.G_TABLE_WINDOW
+            acc = self._fixed_base_accumulate(None, s, self._generator_table(), w)
+            acc = self._fixed_base_accumulate(acc, self.N - e % self.N, table, w)
+            return self._from_jacobian(acc)
+
+        # One double-scalar multiplication instead of two ladders
+        return self.double_scalar_mul(s, self.G, self.N - e % self.N, public_key)
+
+    def public_key_compact(self, private_key: int) -> bytes:
+        """Return the 32-byte x-only public key for a private key."""
+        return self.serialize_pubkey(self.point_mul_base(private_key))
+
+    def sign_compact(self, private_key: int, message: bytes) -> bytes:
+        """Create a 64-byte BIP340 signature (x-only R, even-y convention)."""
+        public_key = self.point_mul_base(private_key)
+        d = private_key % self.N
+        if public_key[1] & 1:
+            d = self.N - d
+        k = random.randrange(1, self.N)
+        R = self.point_mul_base(k)
+        if R[1] & 1:
+            k = self.N - k
+        r_bytes = R[0].to_bytes(32, 'big')
+        e = int.from_bytes(self.tagged_hash("BIP0340/challenge", r_bytes,
+                                            public_key[0].to_bytes(32, 'big'), message), 'big') % self.N
+        return r_bytes + ((k + e * d) % self.N).to_bytes(32, 'big')
+
+    def verify_compact(self, public_key, message: bytes, signature) -> bool:
+        """Verify a 64-byte BIP340 signature against a 32-byte x-only public key.
+
+        public_key and signature may be bytes, bytearray or memoryview slices.
+        """
+        P = self.parse_pubkey(public_key)
+        sig = self.parse_signature(signature)
+        if P is None or sig is None:
+            return False
+        r, s = sig
+        if r >= self.P or s >= self.N:
+            return False
+        sig_view = memoryview(signature)
+        e = int.from_bytes(self.tagged_hash("BIP0340/challenge", sig_view[:32],
+                                            memoryview(public_key)[:32], message), 'big') % self.N
+        R = self._commitment_point(s, e, P)
+        return R is not None and R[1] & 1 == 0 and R[0] == r
+
+    def _batch_equation_holds(self, prepared: List[Tuple[Tuple[int, int], Tuple[int, int], int, int]]) -> bool:
+        """Check sum(a_i*s_i)*G == sum(a_i*R_i) + sum(a_i*e_i*P_i) for random a_i (a_0 = 1)."""
+        n = self.N
+        g_coefficient = 0
+        key_coefficients = {}
+        terms = []
+        for i, (public_key, R, s, e) in enumerate(prepared):
+            a = 1 if i == 0 else secrets.randbits(self.BATCH_COEFFICIENT_BITS) | 1
+            g_coefficient += a * s
+            terms.append((n - a, R))
+            # Signatures from the same key share a single MSM term
+            key_coefficients[public_key] = key_coefficients.get(public_key, 0) + a * e
+        terms.append((g_coefficient, self.G))
+        terms.extend((n - c % n, key) for key, c in key_coefficients.items())
+        return self.multi_scalar_mul(terms) is None
+
+    def _verify_prepared(self, prepared: List[Optional[Tuple[Tuple[int, int], Tuple[int, int], int, int]]]) -> List[bool]:
+        """Batch-check (P, R, s, e) entries, bisecting on failure; None entries are invalid."""
+        results = [False] * len(prepared)
+
+        def check(indices: List[int]) -> None:
+            if not indices:
+                return
+            if len(indices) == 1:
+                public_key, R, s, e = prepared[indices[0]]
+                results[indices[0]] = self._commitment_point(s, e, public_key) == R
+                return
+            if self._batch_equation_holds([prepared[i] for i in indices]):
+                for i in indices:
+                    results[i] = True
+                return
+            mid = len(indices) // 2
+            check(indices[:mid])
+            check(indices[mid:])
+
+        check([i for i, entry in enumerate(prepared) if entry is not None])
+        return results
+
+    def verify_batch(self, items: List[Tuple[Tuple[int, int], bytes, Tuple[Tuple[int, int], int]]]) -> List[bool]:
+        """Verify (public_key, message, signature) triples together; returns one result per item.
+
+        All signatures are checked with one random linear combination. If that
+        fails, the batch is bisected until the invalid signatures are isolated.
+        """
+        prepared = []
+        for public_key, message, (R, s) in items:
+            if self._well_formed(public_key, R, s):
+                prepared.append((public_key, R, s, self.tag_hash(message, R, public_key)))
+            else:
+                prepared.append(None)
+        return self._verify_prepared(prepared)
+
+    def verify_compact_batch(self, items: Iterable[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+        """Batch version of verify_compact for (public_key32, message, signature64) triples.
+
+        Keys, messages and signatures may be memoryview slices of a larger buffer.
+        """
+        prepared = []
+        for public_key, message, signature in items:
+            P = self.parse_pubkey(public_key)
+            sig = self.parse_signature(signature)
+            if P is None or sig is None or sig[1] >= self.N:
+                prepared.append(None)
+                continue
+            R = self.lift_x(sig[0])
+            if R is None:
+                prepared.append(None)
+                continue
+            e = int.from_bytes(self.tagged_hash("BIP0340/challenge", memoryview(signature)[:32],
+                                                memoryview(public_key)[:32], message), 'big') % self.N
+            prepared.append((P, R, sig[1], e))
+        return self._verify_prepared(prepared)
+
+    def aggregate_public_keys(self, public_keys: Iterable[Tuple[int, int]]) -> Tuple[Tuple[int, int], Dict[Tuple[int, int], int]]:
+        """MuSig key aggregation: X = sum(a_i * P_i) with a_i = H(L, P_i), L a hash of the key set.
+
+        The result depends only on the set of keys, and is cached per key set.
+        """
+        keys = tuple(sorted(set(public_keys)))
+        cache = SchnorrSignature._musig_cache
+        cached = cache.get(keys)
+        if cached is not None:
+            cache.move_to_end(keys)
+            return cached
+        encoded = [x.to_bytes(32, 'big') + y.to_bytes(32, 'big') for x, y in keys]
+        key_set_hash = self.tagged_hash("MuSig/keyset", *encoded)
+        coefficients = {
+            key: int.from_bytes(self.tagged_hash("MuSig/coefficient", key_set_hash, data), 'big') % self.N
+            for key, data in zip(keys, encoded)
+        }
+        aggregate = self.multi_scalar_mul([(a, key) for key, a in coefficients.items()])
+        cached = (aggregate, coefficients)
+        cache[keys] = cached
+        if len(cache) > self.MUSIG_CACHE_SIZE:
+            cache.popitem(last=False)
+        return cached
+
+    def _musig_nonce(self) -> Tuple[int, Tuple[int, int]]:
+        """Create one signer's secret nonce k and public nonce point k*G."""
+        k = random.randrange(1, self.N)
+        return k, self.point_mul_base(k)
+
+    def _aggregate_nonces(self, nonce_points: Iterable[Tuple[int, int]]) -> Tuple[int, int]:
+        """Combine the signers' public nonce points into the aggregate nonce R."""
+        acc = None
+        for point in nonce_points:
+            acc = self._jacobian_add_affine(acc, point)
+        return self._from_jacobian(acc)
+
+    def _musig_partial_sign(self, private_key: int, nonce: int, aggregate_nonce: Tuple[int, int],
+                            message: bytes, public_keys: Iterable[Tuple[int, int]]) -> int:
+        """Compute one signer's partial signature s_i = k_i + e * a_i * x_i."""
+        aggregate_key, coefficients = self.aggregate_public_keys(public_keys)
+        a = coefficients[self.point_mul_base(private_key)]
+        e = self.tag_hash(message, aggregate_nonce, aggregate_key)
+        return (nonce + e * a * private_key) % self.N
+
+    def _musig_aggregate(self, partial_signatures: Iterable[int],
+                         aggregate_nonce: Tuple[int, int]) -> Tuple[Tuple[int, int], int]:
+        """Sum partial signatures into one signature verifiable against the aggregate key."""
+        return aggregate_nonce, sum(partial_signatures) % self.N
+
+    def musig_sign(self, private_keys: List[int], message: bytes) -> Tuple[Tuple[int, int], int]:
+        """Run every MuSig signing round locally, for signers that share a process.
+
+        The round helpers are private on purpose: exchanging nonce points between
+        separate signers without a prior commitment round is MuSig1 without its
+        commitments, which concurrent sessions can forge against.
+        """
+        public_keys = [self.point_mul_base(sk) for sk in private_keys]
+        nonces = [self._musig_nonce() for _ in private_keys]
+        R = self._aggregate_nonces(point for _, point in nonces)
+        partials = [self._musig_partial_sign(sk, k, R, message, public_keys)
+                    for sk, (k, _) in zip(private_keys, nonces)]
+        return self._musig_aggregate(partials, R)
+
+class PublicKeyTableCache:
+    """LRU cache of fixed-base tables for public keys that are verified repeatedly.
+
+    Each entry costs a table build (about as much as ten verifications) and
+    roughly 150 KB of memory, so the cache is bounded by max_entries. A key
+    only gets a table when it misses a second time while still among the
+    last 8 * max_entries missed keys; keys seen once are verified without a
+    table and never evict a hot one.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._tables = OrderedDict()
+        # Keys that missed once, oldest first
+        self._candidates = OrderedDict()
+        self.max_candidates = 8 * max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, public_key: Tuple[int, int]) -> Optional[List[List[Tuple[int, int]]]]:
+        """Return the table for public_key, or None if the key has not earned one yet."""
+        table = self._tables.get(public_key)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(public_key)
+            return table
+        self.misses += 1
+        if self._candidates.pop(public_key, None) is None:
+            self._candidates[public_key] = True
+            if len(self._candidates) > self.max_candidates:
+                self._candidates.popitem(last=False)
+            return None
+        table = SchnorrSignature._build_fixed_base_table(public_key, SchnorrSignature.G_TABLE_WINDOW)
+        self._tables[public_key] = table
+        if len(self._tables) > self.max_entries:
+            self._tables.popitem(last=False)
+            self.evictions += 1
+        return table
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def clear(self) -> None:
+        self._tables.clear()
+        self._candidates.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._tables),
+            'max_entries': self.max_entries,
+            'candidates': len(self._candidates),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+# Per-process verifier used by ParallelVerifier workers; created once by the pool initializer
+_worker_schnorr = None
+
+def _init_verify_worker() -> None:
+    """Warm a worker: build the generator tables once so every chunk reuses them."""
+    global _worker_schnorr
+    _worker_schnorr = SchnorrSignature()
+    SchnorrSignature._generator_table()
+    SchnorrSignature._generator_wnaf_table()
+
+def _verify_chunk(chunk: List[Tuple[Tuple[int, int], bytes, Tuple[Tuple[int, int], int]]]) -> List[bool]:
+    """Verify one chunk inside a worker process."""
+    return _worker_schnorr.verify_batch(chunk)
+
+class ParallelVerifier:
+    """Verify (public_key, message, signature) triples across a pool of warm worker processes.
+
+    Items are grouped into chunks so that one IPC round trip carries enough
+    work to amortize pickling, each chunk is batch-verified in a worker, and
+    results come back in the original order. The pool is kept alive between
+    calls; use close() or a with-block to shut it down.
+    """
+
+    DEFAULT_CHUNK_SIZE = 256
+    MIN_CHUNK_SIZE = 16
+    # Chunks in flight per worker: enough to keep workers busy without buffering the whole input
+    PREFETCH_PER_WORKER = 2
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_verify_worker)
+        return self._pool
+
+    def _chunk_size_for(self, items: Iterable) -> int:
+        if self.chunk_size:
+            return self.chunk_size
+        try:
+            total = len(items)
+        except TypeError:
+            return self.DEFAULT_CHUNK_SIZE
+        # Several chunks per worker for load balancing, but never so small that IPC dominates
+        per_chunk = -(-total // (self.workers * 4))
+        return max(self.MIN_CHUNK_SIZE, min(self.DEFAULT_CHUNK_SIZE, per_chunk))
+
+    def _chunks(self, items: Iterable, size: int) -> Iterator[List]:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def verify_iter(self, items: Iterable[Tuple[Tuple[int, int], bytes, Tuple[Tuple[int, int], int]]]) -> Iterator[bool]:
+        """Yield one result per item, in input order, with a bounded number of chunks in flight."""
+        pool = self._executor()
+        pending = deque()
+        limit = self.workers * self.PREFETCH_PER_WORKER
+        for chunk in self._chunks(items, self._chunk_size_for(items)):
+            pending.append(pool.submit(_verify_chunk, chunk))
+            if len(pending) >= limit:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def verify(self, items: Iterable[Tuple[Tuple[int, int], bytes, Tuple[Tuple[int, int], int]]]) -> List[bool]:
+        """Verify all items and return their results in input order."""
+        return list(self.verify_iter(items))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "ParallelVerifier":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# Use the accelerated backend automatically when it is installed
+SchnorrSignature.set_backend('gmpy2' if gmpy2 is not None else 'python')
 
 # Example usage and tests
 def run_tests():
@@ -97,13 +998,207 @@ def run_tests():
     assert not schnorr.verify(public_key, wrong_message, signature)
     print("Test 2 passed: Verification fails with wrong message")
     
-    # Test 3: Batch verification simulation
+    # Test 3: Batch verification
     messages = [b"Message 1", b"Message 2", b"Message 3"]
     signatures = [schnorr.sign(private_key, m) for m in messages]
-    all_valid = all(schnorr.verify(public_key, m, s) 
-                   for m, s in zip(messages, signatures))
-    assert all_valid
-    print("Test 3 passed: Batch verification simulation")
+    assert schnorr.verify_batch([(public_key, m, s) for m, s in zip(messages, signatures)]) == [True] * 3
+    # s is not reduced mod N: both paths reject s + N
+    R, s = signatures[0]
+    assert not schnorr.verify(public_key, messages[0], (R, s + schnorr.N))
+    assert schnorr.verify_batch([(public_key, messages[0], (R, s + schnorr.N))]) == [False]
+    print("Test 3 passed: Batch verification")
+
+    # Test 4: Jacobian arithmetic agrees with textbook affine arithmetic
+    def affine_add(P1, P2):
+        p = SchnorrSignature.P
+        if P1 is None:
+            return P2
+        if P2 is None:
+            return P1
+        x1, y1 = P1
+        x2, y2 = P2
+        if x1 == x2 and (y1 + y2) % p == 0:
+            return None
+        if P1 == P2:
+            lam = 3 * x1 * x1 * pow(2 * y1, p - 2, p) % p
+        else:
+            lam = (y2 - y1) * pow(x2 - x1, p - 2, p) % p
+        x3 = (lam * lam - x1 - x2) % p
+        return (x3, (lam * (x1 - x3) - y1) % p)
+
+    G = schnorr.G
+    expected = None
+    for k in range(1, 20):
+        expected = affine_add(expected, G)
+        assert schnorr.point_mul(k, G) == expected
+    assert schnorr.point_add(G, G) == schnorr.point_mul(2, G)
+    assert schnorr.point_add(G, (G[0], SchnorrSignature.P - G[1])) is None
+    assert schnorr.point_mul(SchnorrSignature.N, G) is None
+    print("Test 4 passed: Jacobian point arithmetic")
+
+    # Test 5: Fixed-base table matches generic double-and-add
+    for k in (1, 2, 15, 16, 17, 0xDEADBEEF, SchnorrSignature.N - 1, random.randrange(1, SchnorrSignature.N)):
+        generic = None
+        addend = G
+        n = k
+        while n:
+            if n & 1:
+                generic = affine_add(generic, addend)
+            addend = affine_add(addend, addend)
+            n >>= 1
+        assert schnorr.point_mul_base(k) == generic
+        assert schnorr.point_mul(k, G) == generic
+    assert schnorr.point_mul_base(SchnorrSignature.N) is None
+    print("Test 5 passed: Fixed-base generator table")
+
+    # Test 6: Strauss and Pippenger multi-scalar multiplication agree with point_mul
+    points = [schnorr.point_mul(random.randrange(1, SchnorrSignature.N), G) for _ in range(4)]
+    scalars = [random.randrange(1, SchnorrSignature.N) for _ in points]
+    expected = None
+    for k, point in zip(scalars, points):
+        expected = schnorr.point_add(expected, schnorr.point_mul(k, point))
+    terms = list(zip(scalars, points))
+    assert schnorr.multi_scalar_mul(terms) == expected
+    assert schnorr._from_jacobian(schnorr._pippenger(terms)) == expected
+    assert schnorr.multi_scalar_mul([(1, G), (SchnorrSignature.N - 1, G)]) is None
+    print("Test 6 passed: Multi-scalar multiplication")
+
+    # Test 7: Batch verification isolates invalid signatures
+    keys = [schnorr.generate_keypair() for _ in range(3)]
+    batch = []
+    for i in range(70):
+        sk, pk = keys[i % len(keys)]
+        msg = f"update {i}".encode()
+        batch.append((pk, msg, schnorr.sign(sk, msg)))
+    bad = {5, 41}
+    for i in bad:
+        pk, msg, sig = batch[i]
+        batch[i] = (pk, msg + b"!", sig)
+    results = schnorr.verify_batch(batch)
+    assert [i for i, ok in enumerate(results) if not ok] == sorted(bad)
+    assert schnorr.verify_batch([]) == []
+    print("Test 7 passed: Batch verification with bisection")
+
+    # Test 8: Shamir double-scalar multiplication
+    a, b = random.randrange(1, SchnorrSignature.N), random.randrange(1, SchnorrSignature.N)
+    expected = schnorr.point_add(schnorr.point_mul(a, G), schnorr.point_mul(b, public_key))
+    assert schnorr.double_scalar_mul(a, G, b, public_key) == expected
+    assert schnorr.double_scalar_mul(b, public_key, a, G) == expected
+    assert schnorr.double_scalar_mul(a, G, SchnorrSignature.N - a, G) is None
+    assert schnorr.double_scalar_mul(0, G, b, public_key) == schnorr.point_mul(b, public_key)
+    print("Test 8 passed: Double-scalar multiplication")
+
+    # Test 9: GLV endomorphism and scalar splitting
+    N = SchnorrSignature.N
+    assert schnorr.point_mul_glv(SchnorrSignature.LAMBDA, G) == \
+        (SchnorrSignature.BETA * G[0] % SchnorrSignature.P, G[1])
+    for k in (1, 2, N - 1, random.randrange(1, N), random.randrange(1, N)):
+        k1, k2 = schnorr.glv_split(k)
+        assert (k1 + k2 * SchnorrSignature.LAMBDA - k) % N == 0
+        assert abs(k1).bit_length() <= 129 and abs(k2).bit_length() <= 129
+        SchnorrSignature.USE_GLV = False
+        expected = schnorr.point_mul(k, public_key)
+        SchnorrSignature.USE_GLV = True
+        assert schnorr.point_mul(k, public_key) == expected
+    print("Test 9 passed: GLV scalar multiplication")
+
+    # Test 10: Parallel verification keeps input order across chunks and calls
+    with ParallelVerifier(workers=2, chunk_size=16) as verifier:
+        assert verifier.verify(batch) == results
+        assert verifier.verify(iter(batch[:20])) == results[:20]
+    print("Test 10 passed: Parallel verification")
+
+    # Test 11: Per-public-key table cache with admission on the second miss and LRU eviction
+    cached = SchnorrSignature(key_cache_size=3)
+    for pk, msg, sig in batch[:5]:
+        assert cached.verify(pk, msg, sig)
+    assert len(cached.key_cache) == 2
+    assert not cached.verify(*batch[5])
+    assert cached.verify(*batch[6])
+    stats = cached.key_cache.stats()
+    assert stats['misses'] == 6 and stats['hits'] == 1 and stats['entries'] == 3 and stats['evictions'] == 0
+    other_sk, other_pk = schnorr.generate_keypair()
+    other_sig = schnorr.sign(other_sk, b"x")
+    # A key seen once is verified without a table and evicts nothing
+    assert cached.verify(other_pk, b"x", other_sig) and cached.key_cache.evictions == 0
+    assert cached.verify(other_pk, b"x", other_sig)
+    assert len(cached.key_cache) == 3 and cached.key_cache.evictions == 1
+    print("Test 11 passed: Public key table cache")
+
+    # Test 12: BIP340 compact encoding and tagged hashing
+    vector_pk = bytes.fromhex("F9308A019258C31049344F85F89D5229B531C845836F99B08601F113BCE036F9")
+    vector_sig = bytes.fromhex("E907831F80848D1069A5371B402410364BDF1C5F8307B0084C55F1CE2DCA8215"
+                               "25F66A4A85EA8B71E482A74F382D2CE5EBEEE8FDB2172F477DF4900D310536C0")
+    assert schnorr.public_key_compact(3) == vector_pk
+    assert schnorr.verify_compact(vector_pk, bytes(32), vector_sig)
+    assert not schnorr.verify_compact(vector_pk, bytes(31) + b"\x01", vector_sig)
+    assert schnorr.tagged_hash("BIP0340/challenge", b"ab", b"c") == \
+        hashlib.sha256(hashlib.sha256(b"BIP0340/challenge").digest() * 2 + b"abc").digest()
+    compact_pk = schnorr.public_key_compact(private_key)
+    compact_sig = schnorr.sign_compact(private_key, message)
+    assert len(compact_pk) == 32 and len(compact_sig) == 64
+    assert schnorr.verify_compact(compact_pk, message, compact_sig)
+    assert not schnorr.verify_compact(compact_pk, wrong_message, compact_sig)
+    buffer = bytearray(96)
+    schnorr.serialize_pubkey(schnorr.parse_pubkey(compact_pk), buffer, 0)
+    schnorr.serialize_signature(schnorr.parse_signature(compact_sig), buffer, 32)
+    view = memoryview(buffer)
+    assert bytes(buffer) == compact_pk + compact_sig
+    assert schnorr.verify_compact(view[:32], message, view[32:])
+    assert cached.verify_compact(compact_pk, message, compact_sig)
+    compact_batch = [(compact_pk, m, schnorr.sign_compact(private_key, m)) for m in messages]
+    compact_batch.append((vector_pk, bytes(32), vector_sig))
+    compact_batch.append((compact_pk, wrong_message, compact_sig))
+    assert schnorr.verify_compact_batch(compact_batch) == [True] * 4 + [False]
+    print("Test 12 passed: Compact BIP340 encoding")
+
+    # Test 13: Bulk key generation and signing with Montgomery batch inversion
+    values = [random.randrange(1, SchnorrSignature.P) for _ in range(5)]
+    assert all(v * inv % SchnorrSignature.P == 1
+               for v, inv in zip(values, schnorr._batch_inverse(values)))
+    keypairs = schnorr.generate_keypairs(10)
+    assert all(schnorr.point_mul(sk, G) == pk for sk, pk in keypairs)
+    bulk_messages = [f"state {i}".encode() for i in range(10)]
+    bulk_signatures = schnorr.sign_many(private_key, bulk_messages)
+    assert schnorr.verify_batch([(public_key, m, sig) for m, sig in zip(bulk_messages, bulk_signatures)]) == [True] * 10
+    assert schnorr.generate_keypairs(0) == [] and schnorr.sign_many(private_key, []) == []
+    print("Test 13 passed: Bulk key generation and signing")
+
+    # Test 14: MuSig aggregation verifies with a single verify call
+    (sk_a, pk_a), (sk_b, pk_b) = schnorr.generate_keypairs(2)
+    aggregate_key, coefficients = schnorr.aggregate_public_keys([pk_a, pk_b])
+    assert schnorr.aggregate_public_keys([pk_b, pk_a]) == (aggregate_key, coefficients)
+    settlement = b"chan1:600:400:7"
+    aggregate_sig = schnorr.musig_sign([sk_a, sk_b], settlement)
+    assert schnorr.verify(aggregate_key, settlement, aggregate_sig)
+    assert not schnorr.verify(aggregate_key, b"chan1:0:1000:7", aggregate_sig)
+    assert not schnorr.verify(pk_a, settlement, aggregate_sig)
+    print("Test 14 passed: MuSig key and signature aggregation")
+
+    # Test 15: Every available field backend gives identical results
+    def backend_results():
+        k = 0x1F2E3D4C5B6A79880123456789ABCDEF0FEDCBA9876543210123456789ABCDEF
+        return (
+            schnorr.point_mul(k, G),
+            schnorr.point_mul(k, public_key),
+            schnorr.point_add(G, public_key),
+            schnorr.double_scalar_mul(k, G, k + 1, public_key),
+            schnorr.multi_scalar_mul([(k, G), (k + 2, public_key)]),
+            schnorr._batch_to_affine([schnorr._to_jacobian(G), None]),
+            schnorr.lift_x(public_key[0]),
+            schnorr.verify(public_key, message, signature),
+            schnorr.verify_compact(vector_pk, bytes(32), vector_sig),
+            schnorr.verify_batch(batch[:8])
+        )
+    original = SchnorrSignature.backend.name
+    outputs = {}
+    for name in available_backends():
+        SchnorrSignature.set_backend(name)
+        outputs[name] = backend_results()
+        assert all(type(c) is int for c in outputs[name][0] + outputs[name][1])
+    SchnorrSignature.set_backend(original)
+    assert all(result == outputs['python'] for result in outputs.values())
+    print(f"Test 15 passed: Field backends agree ({', '.join(outputs)})")
 
 if __name__ == "__main__":
     run_tests()
@@ -0,0 +1,184 @@
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from schnorr import SchnorrSignature
+
+# File layout (all integers little-endian):
+#   header:  magic "SSIG" | version u16 | reserved u16 | record count u64
+#   records: x-only pubkey (32) | signature (64) | message offset u64 | message length u32
+#   messages: raw message bytes; offsets are relative to the end of the record table
+MAGIC = b"SSIG"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+RECORD_SIZE = 32 + 64 + 8 + 4
+MESSAGE_REF = struct.Struct("<QI")
+
+def write_signature_file(path: str, records: Iterable[Tuple[bytes, bytes, bytes]]) -> int:
+    """Write (pubkey32, signature64, message) records to path; returns the record count.
+
+    Messages are spooled to a temporary file while the record table is written,
+    so memory use does not depend on the number of records.
+    """
+    count = 0
+    with open(path, "wb") as out, tempfile.TemporaryFile() as spool:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for public_key, signature, message in records:
+            if len(public_key) != 32 or len(signature) != 64:
+                raise ValueError(f"Record {count} has a malformed key or signature")
+            out.write(public_key)
+            out.write(signature)
+            out.write(MESSAGE_REF.pack(spool.tell(), len(message)))
+            spool.write(message)
+            count += 1
+        spool.seek(0)
+        shutil.copyfileobj(spool, out)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, 0, count))
+    return count
+
+class SignatureFile:
+    """Read-only memory-mapped view of a signature file.
+
+    record() and iteration return bytes copies, which stay valid after the
+    file is closed. StreamingVerifier reads through _record_views() instead,
+    which returns memoryview slices of the mapping so nothing is copied until
+    the verifier hashes or parses it.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is too small to be a signature file")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, _, count = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} signature file")
+        if HEADER.size + count * RECORD_SIZE > size:
+            self.close()
+            raise ValueError(f"{path} is truncated")
+        self.count = count
+        self._messages = HEADER.size + count * RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, index: int) -> Tuple[bytes, bytes, bytes]:
+        """Return (pubkey, signature, message) for one record."""
+        public_key, signature, message = self._record_views(index)
+        return bytes(public_key), bytes(signature), bytes(message)
+
+    def _record_views(self, index: int) -> Tuple[memoryview, memoryview, memoryview]:
+        """Zero-copy (pubkey, signature, message) views; they must be dropped before close()."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        view = self._view
+        start = HEADER.size + index * RECORD_SIZE
+        offset, length = MESSAGE_REF.unpack_from(view, start + 96)
+        offset += self._messages
+        return view[start:start + 32], view[start + 32:start + 96], view[offset:offset + length]
+
+    def __iter__(self) -> Iterator[Tuple[bytes, bytes, bytes]]:
+        for i in range(self.count):
+            yield self.record(i)
+
+    def close(self) -> None:
+        if self._view is not None:
+            view, mapping = self._view, self._mmap
+            self._view = self._mmap = None
+            try:
+                view.release()
+                mapping.close()
+            except BufferError:
+                # Record views are still referenced (e.g. by an exception traceback);
+                # the mapping is unmapped once the last of them is collected
+                pass
+        self._file.close()
+
+    def __enter__(self) -> "SignatureFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class StreamingVerifier:
+    """Verify signature files in bounded-size batches with constant memory."""
+
+    DEFAULT_BATCH_SIZE = 256
+
+    def __init__(self, schnorr: Optional[SchnorrSignature] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.schnorr = schnorr or SchnorrSignature()
+        self.batch_size = batch_size
+
+    def iter_invalid(self, path: str) -> Iterator[int]:
+        """Yield the indices of invalid records in file order."""
+        with SignatureFile(path) as sig_file:
+            for start in range(0, len(sig_file), self.batch_size):
+                stop = min(start + self.batch_size, len(sig_file))
+                batch = [sig_file._record_views(i) for i in range(start, stop)]
+                results = self.schnorr.verify_compact_batch(
+                    (public_key, message, signature) for public_key, signature, message in batch)
+                # Drop the views before the next batch so the mapping can be closed cleanly
+                batch.clear()
+                for offset, ok in enumerate(results):
+                    if not ok:
+                        yield start + offset
+
+    def invalid_indices(self, path: str) -> List[int]:
+        """Return the indices of all invalid records."""
+        return list(self.iter_invalid(path))
+
+# Example usage and tests
+def run_tests():
+    schnorr = SchnorrSignature()
+    private_key = 12345
+    public_key = schnorr.public_key_compact(private_key)
+    messages = [f"channel update {i}".encode() * (i % 3 + 1) for i in range(40)]
+    records = [(public_key, schnorr.sign_compact(private_key, m), m) for m in messages]
+    bad = {3, 17, 39}
+    for i in bad:
+        pk, sig, m = records[i]
+        records[i] = (pk, sig, m + b"tampered")
+
+    fd, path = tempfile.mkstemp(suffix=".ssig")
+    os.close(fd)
+    try:
+        # Test 1: Round trip through the memory-mapped file
+        assert write_signature_file(path, iter(records)) == len(records)
+        with SignatureFile(path) as sig_file:
+            assert len(sig_file) == len(records)
+            pk, sig, m = sig_file.record(17)
+            assert pk == public_key and m == messages[17] + b"tampered"
+        # Records from a plain loop stay valid after the file is closed
+        with SignatureFile(path) as sig_file:
+            for pk, sig, m in sig_file:
+                pass
+        assert (pk, sig, m) == records[-1]
+        # Closing with internal views still alive leaves the mapping to the garbage collector
+        with SignatureFile(path) as sig_file:
+            views = sig_file._record_views(0)
+        assert bytes(views[2]) == messages[0]
+        del views
+        print("Test 1 passed: Signature file round trip")
+
+        # Test 2: Streaming verification reports invalid indices across batch boundaries
+        verifier = StreamingVerifier(schnorr, batch_size=16)
+        assert verifier.invalid_indices(path) == sorted(bad)
+        print("Test 2 passed: Streaming verification")
+
+        # Test 3: Empty files are valid and report nothing
+        write_signature_file(path, [])
+        assert verifier.invalid_indices(path) == []
+        print("Test 3 passed: Empty signature file")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    run_tests()